@@ -0,0 +1,283 @@
+import ctypes
+import threading
+import time
+
+from constants import GAME_PROFILES, CMD_BUFFER_LIMIT
+
+try:
+    import pymem
+    import pymem.process
+    import psutil
+    from command_ring import CommandRing, RING_SLOT_SIZE
+    from remote_arena import RemoteArena, ARENA_SLOT_SIZE
+except ImportError:
+    pymem = None
+
+WAIT_TIMEOUT = 0x102
+
+
+class CommandBackend:
+    ## where MemoryManager sends its commands to
+
+    name = "base"
+    watch_process = False  # whether a ProcessWatcher has to keep this backend attached
+
+    def __init__(self, debug_callback):
+        self._debug = debug_callback
+        self.connected_game_profile = None
+        self.status_message = "Not connected."
+        self.stats = None  # InjectionStats, set by MemoryManager
+
+    def connect(self):
+        raise NotImplementedError
+
+    def disconnect(self, process_exited=False):
+        pass
+
+    def is_connected(self):
+        raise NotImplementedError
+
+    def is_alive(self):
+        return self.is_connected()
+
+    def max_chunk_size(self):
+        return CMD_BUFFER_LIMIT
+
+    def inject(self, command_bytes, value=0):
+        ## command_bytes is newline separated and null terminated, like cbuf_addtext expects it
+        ## returns False if the command was dropped instead of delivered
+        raise NotImplementedError
+
+
+class PymemBackend(CommandBackend):
+    ## the real game, commands are injected into cbuf_addtext
+
+    name = "pymem"
+    watch_process = True
+
+    def __init__(self, debug_callback, use_command_ring=True):
+        super().__init__(debug_callback)
+        self.pm = None
+        self.module_base = None
+        self.use_command_ring = use_command_ring
+        self.command_ring = None
+        self.arena = None
+        self.status_message = "No supported game found."
+
+    def find_running_game(self):
+
+        ## stops at the first supported game instead of collecting every process name
+        for process in psutil.process_iter(['name']):
+            process_name = process.info.get('name')
+            if process_name in GAME_PROFILES:
+                return process_name, GAME_PROFILES[process_name]
+        return None, None
+
+    def connect(self):
+        ## attempts to connect to game
+        self.disconnect()
+
+        if pymem is None:
+            if self.status_message != "pymem is not installed.":
+                self._debug("pymem/psutil are not installed, cannot attach to the game.", is_error=True)
+            self.status_message = "pymem is not installed."
+            return False
+
+        process_name, profile = self.find_running_game()
+
+        if not process_name:
+            self.status_message = "No supported game found."
+            return False
+
+        try:
+            self.pm = pymem.Pymem(process_name)
+            self.module_base = pymem.process.module_from_name(self.pm.process_handle, process_name).lpBaseOfDll
+            self.connected_game_profile = profile
+            self.status_message = f"Connected to {profile['friendly_name']}"
+            self._debug(f"Successfully connected to {process_name} - Base: {hex(self.module_base)}")
+            self._create_arena()
+            if self.use_command_ring:
+                self._start_command_ring()
+            return True
+        except (pymem.exception.ProcessNotFound, pymem.exception.CouldNotOpenProcess, AttributeError) as e:
+            self._debug(f"Failed to connect to {process_name}: {e}", is_error=True)
+            self.status_message = f"Error connecting to {process_name}."
+            self.pm = None
+            self.module_base = None
+            self.connected_game_profile = None
+            return False
+
+    def _start_command_ring(self):
+        ## one consumer thread in the game for the whole session, falls back to a remote thread per command
+        ring = CommandRing(self.pm, self.connected_game_profile['cbuf_addtext'], self._debug)
+        if ring.start():
+            self.command_ring = ring
+        else:
+            self._debug("Command ring unavailable, using a remote thread per command.", is_error=True)
+            self.command_ring = None
+
+    def _create_arena(self):
+        arena = RemoteArena(self.pm, self.connected_game_profile['cbuf_addtext'], self._debug, self.stats)
+        self.arena = arena if arena.create() else None
+
+    def disconnect(self, process_exited=False):
+        ## releases everything allocated in the game process for this session and drops the handle,
+        ## if the process is already gone there is nothing left to free
+        try:
+            if self.command_ring and not process_exited:
+                self.command_ring.stop()
+            if self.arena and not process_exited:
+                self.arena.release()
+        except Exception as e:
+            self._debug(f"Failed to release game memory: {e}", is_error=True)
+        self.command_ring = None
+        self.arena = None
+        if self.pm is not None:
+            try:
+                self.pm.close_process()
+            except Exception:
+                pass
+            self.pm = None
+            self.module_base = None
+            self.connected_game_profile = None
+            if process_exited:
+                self.status_message = "Game closed, waiting for it to restart."
+
+    def is_connected(self):
+        return self.pm is not None and self.connected_game_profile is not None
+
+    def is_alive(self):
+        ## cheap check on the handle we already hold, no process enumeration
+        if not self.is_connected():
+            return False
+        return ctypes.windll.kernel32.WaitForSingleObject(self.pm.process_handle, 0) == WAIT_TIMEOUT
+
+    def max_chunk_size(self):
+        if self.command_ring:
+            return min(CMD_BUFFER_LIMIT, RING_SLOT_SIZE)
+        if self.arena:
+            return min(CMD_BUFFER_LIMIT, ARENA_SLOT_SIZE)
+        return CMD_BUFFER_LIMIT
+
+    def inject(self, command_bytes, value=0):
+        # use the cbuf_addtext addresse from the detected game profile
+        cbuf_addtext_offset = self.connected_game_profile['cbuf_addtext']
+
+        ## the ring consumer always passes 0 in ecx, while it runs it gets every such command so
+        ## nothing can overtake what is still waiting in the ring
+        if self.command_ring and value == 0:
+            started = time.perf_counter()
+            pushed = self.command_ring.push(command_bytes)
+            if self.stats:
+                self.stats.record("ring_push", time.perf_counter() - started)
+            return pushed
+
+        if self.arena and self.arena.run(command_bytes, value):
+            return True
+
+        ## no arena, allocate for this command only and always give the pages back
+        stats = self.stats
+        command_addr = None
+        shellcode_addr = None
+        try:
+            started = time.perf_counter()
+            command_addr = self.pm.allocate(len(command_bytes))
+            allocated = time.perf_counter()
+            self.pm.write_bytes(command_addr, command_bytes, len(command_bytes))
+
+            shellcode = (
+                    b"\xB8" + command_addr.to_bytes(4, 'little') +
+                    b"\xB9" + value.to_bytes(4, 'little') +
+                    b"\xBA" + cbuf_addtext_offset.to_bytes(4, 'little') +  # dynamic address
+                    b"\xFF\xD2" +
+                    b"\xC3"
+            )
+
+            shellcode_addr = self.pm.allocate(len(shellcode))
+            self.pm.write_bytes(shellcode_addr, shellcode, len(shellcode))
+            written = time.perf_counter()
+
+            thread_handle = ctypes.windll.kernel32.CreateRemoteThread(
+                self.pm.process_handle, None, 0, shellcode_addr, None, 0, None
+            )
+            created = time.perf_counter()
+
+            if thread_handle:
+                ctypes.windll.kernel32.WaitForSingleObject(thread_handle, 0xFFFFFFFF)
+                ctypes.windll.kernel32.CloseHandle(thread_handle)
+                if stats:
+                    ## the shellcode allocation is counted with the writes
+                    stats.record("allocate", allocated - started)
+                    stats.record("write", written - allocated)
+                    stats.record("remote_thread", created - written)
+                    stats.record("wait", time.perf_counter() - created)
+                return True
+            self._debug("Failed to create remote thread.", is_error=True)
+            return False
+        finally:
+            freeing = time.perf_counter()
+            if command_addr:
+                self.pm.free(command_addr)
+            if shellcode_addr:
+                self.pm.free(shellcode_addr)
+            if stats and command_addr:
+                stats.record("free", time.perf_counter() - freeing)
+
+
+class RecordingBackend(CommandBackend):
+    ## keeps everything in memory instead of talking to a game, for benchmarks and checks on any machine
+
+    name = "recording"
+
+    def __init__(self, debug_callback, max_records=100000):
+        super().__init__(debug_callback)
+        self.max_records = max_records
+        self.records = []  # (perf_counter timestamp, command text)
+        self.last_values = {}  # dvar -> argument string of the last command for it
+        self.lock = threading.Lock()
+        self.connected = False
+
+    def connect(self):
+        self.connected = True
+        self.connected_game_profile = {"friendly_name": "Recording backend", "cbuf_addtext": 0}
+        self.status_message = "Recording commands (no game attached)"
+        self._debug("Recording backend active, commands are not sent to a game.")
+        return True
+
+    def disconnect(self, process_exited=False):
+        self.connected = False
+
+    def is_connected(self):
+        return self.connected
+
+    def inject(self, command_bytes, value=0):
+        timestamp = time.perf_counter()
+        text = command_bytes.rstrip(b'\x00').decode('ascii', 'replace')
+        with self.lock:
+            for line in text.splitlines():
+                if not line:
+                    continue
+                if len(self.records) < self.max_records:
+                    self.records.append((timestamp, line))
+                parts = line.split(None, 1)
+                self.last_values[parts[0].lower()] = parts[1] if len(parts) > 1 else ""
+        return True
+
+    def clear(self):
+        with self.lock:
+            self.records = []
+            self.last_values = {}
+
+
+BACKENDS = {
+    PymemBackend.name: PymemBackend,
+    RecordingBackend.name: RecordingBackend,
+}
+
+
+def create_backend(name, debug_callback):
+    backend_class = BACKENDS.get(name)
+    if backend_class is None:
+        debug_callback(f"Unknown command backend '{name}', using pymem.", is_error=True)
+        backend_class = PymemBackend
+    return backend_class(debug_callback)
@@ -0,0 +1,99 @@
+import threading
+from collections import OrderedDict, deque
+
+
+def command_key(command):
+    ## dvar name a command writes to, used to coalesce pending writes
+    return command.split(None, 1)[0].lower() if command else ""
+
+
+class CommandQueue:
+    ## injector thread in front of MemoryManager, producers only take a short lock and never wait on the game
+    ## bulk lane: latest value wins per dvar, oldest entries are dropped when it is full
+    ## priority lane: console/hotkey commands, kept in order and sent ahead of bulk traffic
+
+    def __init__(self, send_batch, debug_callback, max_pending=128, drop_callback=None):
+        self.send_batch = send_batch  # returns the commands it could not deliver
+        self._debug = debug_callback
+        self.drop_callback = drop_callback
+        self.max_pending = max_pending
+        self.bulk = OrderedDict()
+        self.priority = deque()
+        self.condition = threading.Condition()
+        self.injector_thread = None
+        self.running = False
+        self.dropped_count = 0
+        self.coalesced_count = 0
+
+    def start(self):
+        if self.injector_thread and self.injector_thread.is_alive():
+            return
+        self.running = True
+        self.injector_thread = threading.Thread(target=self._injector_worker)
+        self.injector_thread.daemon = True
+        self.injector_thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.injector_thread and self.injector_thread.is_alive():
+            self.injector_thread.join(timeout=1.0)
+
+    def submit(self, command, priority=False):
+        if not command:
+            return
+        key = command_key(command)
+        with self.condition:
+            if priority:
+                ## an explicit command is newer than whatever animation frame is still waiting for that dvar
+                self.bulk.pop(key, None)
+                self.priority.append(command)
+            else:
+                self._put_bulk(key, command)
+            self.condition.notify()
+
+    def submit_many(self, commands):
+        with self.condition:
+            for command in commands:
+                if command:
+                    self._put_bulk(command_key(command), command)
+            self.condition.notify()
+
+    def _put_bulk(self, key, command):
+        if key in self.bulk:
+            del self.bulk[key]
+            self.coalesced_count += 1
+        elif len(self.bulk) >= self.max_pending:
+            dropped_key, _ = self.bulk.popitem(last=False)
+            self._dropped(dropped_key)
+        self.bulk[key] = command
+
+    def _dropped(self, key):
+        self.dropped_count += 1
+        if self.drop_callback:
+            self.drop_callback(key)
+
+    def _injector_worker(self):
+        while True:
+            with self.condition:
+                while self.running and not self.priority and not self.bulk:
+                    self.condition.wait()
+                if not self.running:
+                    break
+                batch = list(self.priority)
+                batch.extend(self.bulk.values())
+                self.priority.clear()
+                self.bulk.clear()
+
+            try:
+                dropped = self.send_batch(batch)
+            except Exception as e:
+                self._debug(f"Command queue: injection failed: {e}", is_error=True)
+                dropped = batch
+
+            ## undelivered commands are forgotten like bulk entries dropped under backpressure
+            if dropped:
+                with self.condition:
+                    for command in dropped:
+                        self._dropped(command_key(command))
@@ -0,0 +1,213 @@
+import ctypes
+import struct
+import threading
+import time
+
+import pymem.process
+
+## ring layout in the game process:
+## [head u32][tail u32][stop u32][pad u32][slot 0][slot 1]...[slot n-1][consumer stub]
+RING_SLOT_COUNT = 64  # must be a power of two, the stub masks the tail index with it
+RING_SLOT_SIZE = 1024
+RING_HEADER_SIZE = 16
+RING_FULL_TIMEOUT = 0.05  # seconds a producer waits for a free slot before dropping the command
+RING_DRAIN_TIMEOUT = 1.0  # seconds stop() waits for the consumer to hand out what is still queued
+
+WAIT_OBJECT_0 = 0
+
+
+def find_remote_export(pm, module_name, export_name):
+    ## walks the pe export table of a module loaded in the target process
+    module = pymem.process.module_from_name(pm.process_handle, module_name)
+    if not module:
+        return None
+    base = module.lpBaseOfDll
+    nt_headers = base + pm.read_int(base + 0x3C)
+    export_rva = pm.read_uint(nt_headers + 0x78)
+    export_size = pm.read_uint(nt_headers + 0x7C)
+    if not export_rva:
+        return None
+
+    export_dir = base + export_rva
+    name_count = pm.read_uint(export_dir + 0x18)
+    functions = base + pm.read_uint(export_dir + 0x1C)
+    names = base + pm.read_uint(export_dir + 0x20)
+    ordinals = base + pm.read_uint(export_dir + 0x24)
+
+    wanted = export_name.encode('ascii')
+    for i in range(name_count):
+        name_addr = base + pm.read_uint(names + i * 4)
+        if pm.read_bytes(name_addr, len(wanted) + 1) != wanted + b'\x00':
+            continue
+        ordinal = pm.read_ushort(ordinals + i * 2)
+        function_rva = pm.read_uint(functions + ordinal * 4)
+        if export_rva <= function_rva < export_rva + export_size:
+            return None  # forwarded export, caller has to look in the target dll
+        return base + function_rva
+    return None
+
+
+class CommandRing:
+    ## single producer ring buffer living in the game process, drained into cbuf_addtext by a
+    ## long-lived stub thread so a command costs two WriteProcessMemory calls instead of a remote thread
+
+    def __init__(self, pm, cbuf_addtext, debug_callback):
+        self.pm = pm
+        self.cbuf_addtext = cbuf_addtext
+        self._debug = debug_callback
+        self.base = None
+        self.thread_handle = None
+        self.head = 0
+        self.lock = threading.Lock()
+
+    @property
+    def head_addr(self):
+        return self.base
+
+    @property
+    def tail_addr(self):
+        return self.base + 4
+
+    @property
+    def stop_addr(self):
+        return self.base + 8
+
+    @property
+    def slots_addr(self):
+        return self.base + RING_HEADER_SIZE
+
+    @property
+    def stub_addr(self):
+        return self.slots_addr + RING_SLOT_COUNT * RING_SLOT_SIZE
+
+    def _resolve_sleep(self):
+        for module_name in ("kernel32.dll", "KernelBase.dll"):
+            address = find_remote_export(self.pm, module_name, "Sleep")
+            if address:
+                return address
+        return None
+
+    def _build_consumer_stub(self, sleep_addr):
+        def addr(value):
+            return value.to_bytes(4, 'little')
+
+        ## loop:
+        ##   if stop: goto done
+        ##   if tail == head: Sleep(1); goto loop
+        ##   cbuf_addtext(slots + (tail & mask) * slot_size); tail++; goto loop
+        return (
+                b"\x83\x3D" + addr(self.stop_addr) + b"\x00" +  # cmp dword [stop], 0
+                b"\x75\x3C" +  # jne done
+                b"\xA1" + addr(self.tail_addr) +  # mov eax, [tail]
+                b"\x3B\x05" + addr(self.head_addr) +  # cmp eax, [head]
+                b"\x74\x24" +  # je idle
+                b"\x25" + addr(RING_SLOT_COUNT - 1) +  # and eax, mask
+                b"\x69\xC0" + addr(RING_SLOT_SIZE) +  # imul eax, eax, slot_size
+                b"\x05" + addr(self.slots_addr) +  # add eax, slots
+                b"\xB9" + addr(0) +  # mov ecx, 0
+                b"\xBA" + addr(self.cbuf_addtext) +  # mov edx, cbuf_addtext
+                b"\xFF\xD2" +  # call edx
+                b"\xFF\x05" + addr(self.tail_addr) +  # inc dword [tail]
+                b"\xEB\xC6" +  # jmp loop
+                ## idle:
+                b"\x6A\x01" +  # push 1
+                b"\xBA" + addr(sleep_addr) +  # mov edx, Sleep
+                b"\xFF\xD2" +  # call edx
+                b"\xEB\xBB" +  # jmp loop
+                ## done:
+                b"\x31\xC0" +  # xor eax, eax
+                b"\xC2\x04\x00"  # ret 4
+        )
+
+    def start(self):
+        sleep_addr = self._resolve_sleep()
+        if not sleep_addr:
+            self._debug("Command ring: could not resolve Sleep in the game process.", is_error=True)
+            return False
+
+        total_size = RING_HEADER_SIZE + RING_SLOT_COUNT * RING_SLOT_SIZE + 128
+        self.base = self.pm.allocate(total_size)
+        if not self.base:
+            self._debug("Command ring: allocation failed.", is_error=True)
+            self.base = None
+            return False
+
+        try:
+            self.pm.write_bytes(self.base, bytes(RING_HEADER_SIZE), RING_HEADER_SIZE)
+            stub = self._build_consumer_stub(sleep_addr)
+            self.pm.write_bytes(self.stub_addr, stub, len(stub))
+
+            self.thread_handle = ctypes.windll.kernel32.CreateRemoteThread(
+                self.pm.process_handle, None, 0, self.stub_addr, None, 0, None
+            )
+        except Exception as e:
+            self._debug(f"Command ring: setup failed: {e}", is_error=True)
+            self.thread_handle = None
+
+        if not self.thread_handle:
+            self._debug("Command ring: failed to start consumer thread.", is_error=True)
+            self.pm.free(self.base)
+            self.base = None
+            return False
+
+        self.head = 0
+        self._debug(f"Command ring started at {hex(self.base)} ({RING_SLOT_COUNT} slots).")
+        return True
+
+    def is_running(self):
+        return self.base is not None and self.thread_handle is not None
+
+    def push(self, command_bytes):
+        ## command_bytes must already be null terminated, returns False if the command was dropped
+        if len(command_bytes) > RING_SLOT_SIZE:
+            self._debug("Command does not fit into a ring slot, dropping it.", is_error=True)
+            return False
+
+        with self.lock:
+            deadline = time.perf_counter() + RING_FULL_TIMEOUT
+            while (self.head - self.pm.read_uint(self.tail_addr)) & 0xFFFFFFFF >= RING_SLOT_COUNT:
+                if time.perf_counter() >= deadline:
+                    ## injecting it some other way would let it overtake the commands still in the ring
+                    self._debug("Command ring full, dropping command.", is_error=True)
+                    return False
+                time.sleep(0.001)
+
+            slot_addr = self.slots_addr + (self.head & (RING_SLOT_COUNT - 1)) * RING_SLOT_SIZE
+            self.pm.write_bytes(slot_addr, command_bytes, len(command_bytes))
+            ## publish the slot only after its text is in place
+            self.head = (self.head + 1) & 0xFFFFFFFF
+            self.pm.write_bytes(self.head_addr, struct.pack('<I', self.head), 4)
+        return True
+
+    def _drain(self):
+        ## the consumer checks the stop flag before every slot, so let it empty the ring first
+        deadline = time.perf_counter() + RING_DRAIN_TIMEOUT
+        while self.pm.read_uint(self.tail_addr) != self.head:
+            if time.perf_counter() >= deadline:
+                self._debug("Command ring: consumer did not drain the ring before stopping.", is_error=True)
+                return
+            time.sleep(0.001)
+
+    def stop(self):
+        if not self.is_running():
+            return
+
+        kernel32 = ctypes.windll.kernel32
+        stopped = False
+        try:
+            with self.lock:
+                self._drain()
+                self.pm.write_bytes(self.stop_addr, struct.pack('<I', 1), 4)
+            stopped = kernel32.WaitForSingleObject(self.thread_handle, 1000) == WAIT_OBJECT_0
+        except Exception as e:
+            self._debug(f"Command ring: stop failed: {e}", is_error=True)
+        finally:
+            kernel32.CloseHandle(self.thread_handle)
+            self.thread_handle = None
+
+        if stopped:
+            self.pm.free(self.base)
+        else:
+            ## the stub may still be executing from this page, leaking it is safer than freeing it
+            self._debug("Command ring consumer did not exit, leaving its memory allocated.", is_error=True)
+        self.base = None
@@ -15,6 +15,10 @@ GAME_PROFILES = {
 }
 
 
+## size of the engine's command text buffer, batched commands are split to stay below it
+CMD_BUFFER_LIMIT = 16384
+
+
 #defaults
 MEMORY_MAP = {
     "defaults": {
@@ -37,5 +41,23 @@ MEMORY_MAP = {
         "fog_start": 250.0,
         "dof_enabled": False,
         "glow_enabled": False,
+    },
+    ## dvars the animated properties end up in, the property emitter builds its command templates from this
+    ## properties: fill the arguments in order, type: float / int / color, precision: decimals (default 2)
+    ## min_step: smallest change worth sending during playback, smaller changes wait until they add up
+    "dvars": {
+        "r_lighttweaksunlight": {"properties": ["sun_strength"], "type": "float", "min_step": 0.02},
+        "r_lighttweaksundirection": {"properties": ["sun_direction_x", "sun_direction_y"], "type": "float",
+                                     "min_step": 0.1},
+        "r_lighttweaksuncolor": {"properties": ["sun_color"], "type": "color", "min_step": 0.02},
+        "r_filmtweakbrightness": {"properties": ["brightness"], "type": "float", "min_step": 0.01},
+        "r_filmtweakcontrast": {"properties": ["contrast"], "type": "float", "min_step": 0.01},
+        "r_filmtweakdesaturation": {"properties": ["desaturation"], "type": "float", "min_step": 0.01},
+        "r_filmtweaklighttint": {"properties": ["light_color"], "type": "color", "min_step": 0.02},
+        "r_filmtweakdarktint": {"properties": ["dark_color"], "type": "color", "min_step": 0.02},
+        ## mvm_fog_* come from wawmvm
+        "mvm_fog_start": {"properties": ["fog_start"], "type": "float", "min_step": 1.0},
+        "mvm_fog_color": {"properties": ["fog_color"], "type": "color", "min_step": 0.02},
+        "cg_fov": {"properties": ["fov"], "type": "int", "min_step": 1},
     }
 }
\ No newline at end of file
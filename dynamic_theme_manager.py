@@ -294,17 +294,31 @@ class DynamicThemeManager:
         else:
             self._stop_animation()
 
-    def _start_rainbow_animation(self):
+    def _run_theme_effect(self, name, script):
+        ## rebuilding a theme is too slow for the effect engine's tick, so theme animations keep a thread
+        ## of their own, the script yields how long to sleep, starting one replaces the previous one
         self._stop_animation()
         self.stop_animation = False
 
+        def worker():
+            for delay in script():
+                if self.stop_animation:
+                    break
+                time.sleep(delay)
+
+        self.animation_thread = threading.Thread(target=worker, name=name)
+        self.animation_thread.daemon = True
+        self.animation_thread.start()
+
+    def _start_rainbow_animation(self):
+
         if dpg.does_item_exist("theme_selector"):
             dpg.set_value("theme_selector", "Custom")
 
         def rainbow_worker():
             hue = 0
             base = self.color_schemes["Default"].copy()
-            while not self.stop_animation and self.rainbow_mode:
+            while self.rainbow_mode:
                 rgb = colorsys.hsv_to_rgb(hue / 360.0, 0.7, 1.0)
                 primary_color = [int(c * 255) for c in rgb]
 
@@ -322,15 +336,11 @@ class DynamicThemeManager:
                 self._apply_theme(theme_name="Custom")
 
                 hue = (hue + self.color_transition_speed) % 360
-                time.sleep(0.05)
+                yield 0.05
 
-        self.animation_thread = threading.Thread(target=rainbow_worker)
-        self.animation_thread.daemon = True
-        self.animation_thread.start()
+        self._run_theme_effect("Rainbow theme", rainbow_worker)
 
     def _start_pulse_animation(self):
-        self._stop_animation()
-        self.stop_animation = False
 
         if dpg.does_item_exist("theme_selector"):
             dpg.set_value("theme_selector", "Custom")
@@ -341,7 +351,7 @@ class DynamicThemeManager:
             if not base_colors or 'primary' not in base_colors:
                 base_colors = self.color_schemes["Default"].copy()
 
-            while not self.stop_animation and self.pulse_mode:
+            while self.pulse_mode:
                 intensity = (math.sin(phase) + 1) / 2
 
                 pulsed_primary = [
@@ -354,21 +364,18 @@ class DynamicThemeManager:
                 self._apply_theme(theme_name="Custom")
 
                 phase += 0.1 * self.color_transition_speed
-                time.sleep(0.05)
+                yield 0.05
 
-        self.animation_thread = threading.Thread(target=pulse_worker)
-        self.animation_thread.daemon = True
-        self.animation_thread.start()
+        self._run_theme_effect("Pulse theme", pulse_worker)
 
     def _start_reactive_mode(self):
-        self._stop_animation()
-        self.stop_animation = False
 
         if dpg.does_item_exist("theme_selector"):
             dpg.set_value("theme_selector", "Custom")
 
         def reactive_worker():
-            while not self.stop_animation and self.reactive_mode:
+            applied = None
+            while self.reactive_mode:
                 if hasattr(self.app, 'sun_animator') and self.app.sun_animator.is_animating:
                     reactive_colors = self.color_schemes.get("Sunset", self.original_theme)
                 elif hasattr(self.app, 'memory_manager') and not self.app.memory_manager.is_connected():
@@ -378,13 +385,14 @@ class DynamicThemeManager:
                 else:
                     reactive_colors = self.color_schemes.get("Ocean", self.original_theme)
 
-                self.color_schemes["Custom"] = reactive_colors
-                self._apply_theme(theme_name="Custom")
-                time.sleep(0.5)
+                ## the state rarely changes, only rebuild the theme when it does
+                if reactive_colors != applied:
+                    self.color_schemes["Custom"] = reactive_colors
+                    self._apply_theme(theme_name="Custom")
+                    applied = reactive_colors
+                yield 0.5
 
-        self.animation_thread = threading.Thread(target=reactive_worker)
-        self.animation_thread.daemon = True
-        self.animation_thread.start()
+        self._run_theme_effect("Reactive theme", reactive_worker)
 
     def _update_animation_speed(self, sender, app_data):
         self.color_transition_speed = app_data
@@ -0,0 +1,385 @@
+import math
+import operator
+import threading
+import time
+from tick_scheduler import TickScheduler
+
+ENGINE_RATE = 60
+## one effect per slot, when two slots set the same base property in a frame the later slot wins
+EFFECT_SLOTS = ("animation", "orbit", "transition", "flicker", "sequence", "action")
+
+## yielded by a script to continue on the next tick, a script can also yield a Completion
+## (any effect is one) to continue once it has completed
+FRAME = None
+
+## how an effect's value combines with the others on the same property:
+## base values are replaced by later slots, modifiers scale or offset the base, overrides replace everything
+BASE = "base"
+ADD = "add"
+MULTIPLY = "multiply"
+OVERRIDE = "override"
+
+
+class EngineFrame:
+    ## property values gathered from every active effect during one tick
+
+    def __init__(self):
+        self.values = {}  # base and override layers
+        self.sources = {}  # property -> source of the effect that set it
+        self.exact = set()  # properties at a segment end, sent even if the change is below the budget
+        self.modifiers = {}  # property -> [(layer, value, rest value)]
+        self.overridden = set()
+
+    def set(self, prop, value, source, exact=False, layer=BASE):
+        if layer == BASE and prop in self.overridden:
+            return
+        if layer == OVERRIDE:
+            self.overridden.add(prop)
+        self.values[prop] = value
+        self.sources[prop] = source
+        if exact:
+            self.exact.add(prop)
+        else:
+            self.exact.discard(prop)
+
+    def add_modifiers(self, effect):
+        for prop, modifier in effect.modifiers.items():
+            self.modifiers.setdefault(prop, []).append(modifier)
+            self.sources.setdefault(prop, effect.source)
+
+    def resolve(self):
+        ## one value per property: base (or rest) * factors + offsets, overridden properties stay as they are
+        if not self.modifiers:
+            return self.values
+        values = dict(self.values)
+        for prop, modifiers in self.modifiers.items():
+            if prop in self.overridden:
+                continue
+            value = values.get(prop)
+            if value is None:
+                value = next((rest for _, _, rest in modifiers if rest is not None), None)
+                if value is None:
+                    continue
+            for layer, amount, _ in modifiers:
+                if layer == MULTIPLY:
+                    value = _combine(value, amount, operator.mul)
+            for layer, amount, _ in modifiers:
+                if layer == ADD:
+                    value = _combine(value, amount, operator.add)
+            values[prop] = value
+        return values
+
+
+def _combine(value, amount, op):
+    ## colors combine per component, a single number applies to every component
+    if isinstance(value, list):
+        if isinstance(amount, list):
+            return [op(a, b) for a, b in zip(value, amount)]
+        return [op(a, amount) for a in value]
+    return op(value, amount)
+
+
+class Completion:
+    ## handle for something that ends later: callers wait on it with add_done_callback(),
+    ## cancel() asks whatever it belongs to to stop, cancelled tells a stopped one from one that ran to its end
+
+    def __init__(self, on_cancel=None):
+        self.on_cancel = on_cancel
+        self.done = False
+        self.cancelled = False
+        self.completed_at = None  # engine time of the tick it completed on
+        self.done_callbacks = []
+        self.done_lock = threading.Lock()
+
+    def cancel(self):
+        if self.on_cancel:
+            self.on_cancel()
+
+    def add_done_callback(self, callback):
+        ## callback(completion) on the engine thread once it completed, right away if it already has
+        with self.done_lock:
+            if not self.done:
+                self.done_callbacks.append(callback)
+                return
+        callback(self)
+
+    def complete(self, now, cancelled=False):
+        ## returns the callbacks to run, the caller runs them outside the lock
+        with self.done_lock:
+            if self.done:
+                return []
+            self.done = True
+            self.cancelled = cancelled
+            self.completed_at = now
+            callbacks, self.done_callbacks = self.done_callbacks, []
+        return callbacks
+
+
+class Effect(Completion):
+    ## something the engine advances once per tick, subclasses implement tick()
+    ## the effect is its own completion handle, cancelling it stops it
+
+    def __init__(self, name, source, on_complete=None):
+        super().__init__(on_cancel=self.stop)
+        self.name = name
+        self.source = source  # caller name for the injection stats
+        self.on_complete = on_complete  # called once the effect finished or was stopped
+        self.started_at = 0.0
+        self.now = 0.0
+        self.frame = None
+        self.finished = False
+        self.stop_requested = False
+        self.modifiers = {}  # property -> (layer, value, rest value), applied on every tick until changed
+
+    def begin(self, now):
+        self.started_at = now
+        self.now = now
+
+    def elapsed(self):
+        return self.now - self.started_at
+
+    def set(self, prop, value, exact=False, layer=BASE):
+        ## exact marks a value that has to reach the game as it is, like the end of a fade
+        if layer == ADD or layer == MULTIPLY:
+            self.modify(prop, value, layer, exact=exact)
+        else:
+            self.frame.set(prop, value, self.source, exact, layer)
+
+    def set_values(self, values, exact=False, layer=BASE):
+        for prop, value in values.items():
+            if value is not None:
+                self.set(prop, value, exact, layer)
+
+    def modify(self, prop, value, layer, rest=None, exact=False):
+        ## unlike base values a modifier holds until it is changed or the effect ends
+        ## rest is what it applies to when no effect sets a base value for the property, it is only
+        ## taken the first time, afterwards the engine keeps it at the last base value the modifier saw
+        previous = self.modifiers.get(prop)
+        if previous is not None and previous[2] is not None:
+            rest = previous[2]
+        self.modifiers[prop] = (layer, value, rest)
+        if exact:
+            self.frame.exact.add(prop)
+
+    def tick(self, now):
+        raise NotImplementedError
+
+    def close(self):
+        ## the effect was stopped, last chance to write into self.frame
+        pass
+
+    def stop(self):
+        self.stop_requested = True
+
+
+class ScriptEffect(Effect):
+    ## runs a generator made by script(effect): it yields FRAME to continue on the next tick,
+    ## a delay in seconds or a Completion to wait for, delays are chained from the previous wake-up
+    ## (or from the moment the awaited completion happened) so they don't drift
+
+    def __init__(self, name, source, script, on_complete=None):
+        super().__init__(name, source, on_complete)
+        self.script = script(self)
+        self.wake_at = 0.0
+        self.awaiting = None  # Completion the script waits for
+
+    def begin(self, now):
+        super().begin(now)
+        self.wake_at = now
+
+    def tick(self, now):
+        self.now = now
+        while now >= self.wake_at and not self.stop_requested:
+            try:
+                delay = next(self.script)
+            except StopIteration:
+                self.finished = True
+                return
+            if delay is FRAME:
+                self.wake_at = now
+                return
+            if isinstance(delay, Completion):
+                self.awaiting = delay
+                self.wake_at = math.inf
+                delay.add_done_callback(self._resume)
+                if self.awaiting is not None:
+                    return
+                continue
+            self.wake_at += delay
+
+    def _resume(self, completion):
+        if self.awaiting is completion:
+            self.awaiting = None
+            self.wake_at = completion.completed_at
+
+    def close(self):
+        ## runs the script's finally blocks, stopping the script cancels what it waits for
+        awaiting, self.awaiting = self.awaiting, None
+        if awaiting is not None:
+            awaiting.cancel()
+        self.script.close()
+
+
+class EffectEngine:
+    ## one thread owns time for every effect: each tick advances all active effects
+    ## and hands their combined property values to emit_frame as a single frame
+
+    def __init__(self, emit_frame, debug_callback, rate=ENGINE_RATE):
+        self.emit_frame = emit_frame
+        self._debug = debug_callback
+        self.frame_delay = 1.0 / rate
+        self.effects = {}  # slot -> effect
+        self.retired = []  # replaced effects that still have to be closed
+        self.lock = threading.RLock()
+        self.wake = threading.Event()
+        self.running = False
+        self.engine_thread = None
+        self.scheduler = TickScheduler(should_stop=lambda: not self.running)
+
+    def start(self):
+        if self.engine_thread and self.engine_thread.is_alive():
+            return
+        self.running = True
+        self.engine_thread = threading.Thread(target=self._engine_worker)
+        self.engine_thread.daemon = True
+        self.engine_thread.start()
+
+    def shutdown(self):
+        self.running = False
+        self.wake.set()
+        if self.engine_thread and self.engine_thread.is_alive():
+            self.engine_thread.join(timeout=1.0)
+
+    def run(self, slot, effect):
+        ## replaces whatever runs in the slot, the old effect is closed on the next tick
+        if slot not in EFFECT_SLOTS:
+            raise ValueError(f"Unknown effect slot '{slot}'")
+        with self.lock:
+            previous = self.effects.get(slot)
+            if previous:
+                previous.stop()
+                self.retired.append(previous)
+            effect.begin(time.perf_counter())
+            self.effects[slot] = effect
+        self.wake.set()
+        return effect
+
+    def stop(self, slot):
+        with self.lock:
+            effect = self.effects.get(slot)
+            if effect:
+                effect.stop()
+
+    def stop_all(self):
+        with self.lock:
+            for effect in self.effects.values():
+                effect.stop()
+
+    def get(self, slot):
+        ## the effect running in the slot, None if there is none or it is done
+        with self.lock:
+            effect = self.effects.get(slot)
+            if effect is None or effect.stop_requested or effect.finished:
+                return None
+            return effect
+
+    def is_running(self, slot):
+        with self.lock:
+            effect = self.effects.get(slot)
+            return effect is not None and not effect.stop_requested and not effect.finished
+
+    def _engine_worker(self):
+        while self.running:
+            self.wake.clear()
+            with self.lock:
+                idle = not self.effects and not self.retired
+            if idle:
+                self.scheduler.report(self._debug, "Effect engine")
+                self.wake.wait()
+                self.scheduler.start()
+                continue
+
+            self._tick(time.perf_counter())
+            self.scheduler.wait_frame(self.frame_delay)
+
+    def _tick(self, now):
+        frame = EngineFrame()
+        with self.lock:
+            retired = self.retired
+            self.retired = []
+            active = [(slot, self.effects[slot]) for slot in EFFECT_SLOTS if slot in self.effects]
+
+        done = []
+        modifying = []
+        for effect in retired:
+            ## an effect replaced while it was ticking may already have been closed and completed
+            if effect.done:
+                continue
+            self._close(effect, frame)
+            frame.add_modifiers(effect)
+            if self._complete(effect, now):
+                done.append(effect)
+
+        for slot, effect in active:
+            effect.frame = frame
+            try:
+                if not effect.stop_requested:
+                    effect.tick(now)
+                if effect.stop_requested:
+                    self._close(effect, frame)
+            except Exception as e:
+                self._debug(f"Effect '{effect.name}' failed: {e}", is_error=True)
+                effect.stop()
+                effect.finished = True
+            if effect.modifiers:
+                frame.add_modifiers(effect)
+                modifying.append(effect)
+
+            if effect.finished or effect.stop_requested:
+                with self.lock:
+                    if self.effects.get(slot) is effect:
+                        del self.effects[slot]
+                ## effects waiting on this one resume in this tick if their slot comes later
+                if self._complete(effect, now):
+                    done.append(effect)
+
+        ## a modifier keeps applying to the last base value it saw once the effect setting it ends
+        for effect in modifying:
+            for prop, (layer, value, rest) in effect.modifiers.items():
+                base = frame.values.get(prop)
+                if base is not None and prop not in frame.overridden:
+                    effect.modifiers[prop] = (layer, value, base)
+
+        if frame.values or frame.modifiers:
+            try:
+                self.emit_frame(frame)
+            except Exception as e:
+                self._debug(f"Effect engine: emitting frame failed: {e}", is_error=True)
+
+        for effect in done:
+            if effect.on_complete:
+                try:
+                    effect.on_complete()
+                except Exception as e:
+                    self._debug(f"Effect '{effect.name}' completion callback failed: {e}", is_error=True)
+
+    def _complete(self, effect, now):
+        ## False if the effect was already completed, its callbacks must not run twice
+        if effect.done:
+            return False
+        for callback in effect.complete(now, cancelled=effect.stop_requested):
+            try:
+                callback(effect)
+            except Exception as e:
+                self._debug(f"Effect '{effect.name}' done callback failed: {e}", is_error=True)
+        return True
+
+    def _close(self, effect, frame):
+        if effect.finished:
+            return
+        effect.frame = frame
+        try:
+            effect.close()
+        except Exception as e:
+            self._debug(f"Effect '{effect.name}' failed to stop: {e}", is_error=True)
+        effect.finished = True
@@ -0,0 +1,126 @@
+import threading
+from engine import Completion, Effect
+from preset_vectors import ENVIRONMENT_VECTORS, TRANSITION_EPSILON
+
+## a sequence moves on to its next transition this far into a hop, the retarget keeps the motion going
+TRANSITION_HANDOFF = 0.8
+
+
+class EnvironmentTransition(Effect):
+    ## cubic Hermite per vector column from the current state to a preset, ending at rest on the preset
+    ## retarget() starts a new curve from the current position with the current velocity, so changing
+    ## the destination mid-flight doesn't jerk and nothing has to be stopped or re-applied
+
+    def __init__(self, start_vector, on_arrive=None):
+        super().__init__("Environment transition", "transition")
+        self.on_arrive = on_arrive  # called with the preset name once a target is reached
+        self.current = list(start_vector)
+        self.velocity = [0.0] * len(start_vector)  # per column, change per second
+        self.targets = {}  # column -> value it is heading to
+        self.curves = []  # (column, a, b, c, d) with value(u) = ((a * u + b) * u + c) * u + d
+        self.layout = []  # PRESET_LAYOUT entries with a moving column
+        self.segment_start = 0.0
+        self.sampled_at = 0.0  # elapsed time current and velocity were evaluated at
+        self.duration = 0.0
+        self.preset_name = None
+        self.preset_id = None
+        self.pending = None
+        self.retarget_lock = threading.Lock()
+        self.milestones = []  # (progress, Completion) waiting for the current hop to get that far
+        self.add_done_callback(self._end_milestones)
+
+    def retarget(self, preset_name, duration):
+        ## heads for another preset from wherever the transition is now, False once it has finished
+        with self.retarget_lock:
+            if self.finished or self.stop_requested:
+                return False
+            self.pending = (preset_name, duration)
+            return True
+
+    def reach(self, progress):
+        ## completes in the tick the current hop gets this far, or when the transition ends,
+        ## cancelling it stops the transition
+        milestone = Completion(on_cancel=self.stop)
+        with self.done_lock:
+            if not self.done:
+                self.milestones.append((progress, milestone))
+                return milestone
+        for callback in milestone.complete(self.completed_at, self.cancelled):
+            callback(milestone)
+        return milestone
+
+    def _pass_milestones(self, now, u):
+        with self.done_lock:
+            reached = [milestone for progress, milestone in self.milestones if u >= progress]
+            self.milestones = [entry for entry in self.milestones if u < entry[0]]
+        for milestone in reached:
+            for callback in milestone.complete(now):
+                callback(milestone)
+
+    def _end_milestones(self, transition):
+        with self.done_lock:
+            milestones, self.milestones = self.milestones, []
+        for _, milestone in milestones:
+            for callback in milestone.complete(transition.completed_at, transition.cancelled):
+                callback(milestone)
+
+    def _begin(self, preset_name, duration):
+        presets = ENVIRONMENT_VECTORS
+        preset_id = presets.get(preset_name)
+        end = presets.vectors[preset_id]
+        for column in presets.columns(presets.layouts[preset_id]):
+            self.targets[column] = end[column]
+
+        ## columns still moving towards an older target keep heading there
+        duration = max(duration, 1e-3)
+        self.curves = []
+        for column, p1 in self.targets.items():
+            p0 = self.current[column]
+            m0 = self.velocity[column] * duration
+            if abs(p1 - p0) <= TRANSITION_EPSILON and abs(m0) <= TRANSITION_EPSILON:
+                continue
+            self.curves.append((column, 2.0 * p0 + m0 - 2.0 * p1, 3.0 * (p1 - p0) - 2.0 * m0, m0, p0))
+        self.layout = ENVIRONMENT_VECTORS.entries({column for column, _, _, _, _ in self.curves})
+
+        ## the curve starts where current was sampled, so the retarget tick is already one frame into it
+        ## and a transition with nothing to move arrives on this tick
+        self.segment_start = self.sampled_at
+        self.duration = duration if self.curves else 0.0
+        self.preset_name = preset_name
+        self.preset_id = preset_id
+
+    def tick(self, now):
+        self.now = now
+        elapsed = self.elapsed()
+        with self.retarget_lock:
+            pending, self.pending = self.pending, None
+            if pending:
+                self._begin(*pending)
+            u = (elapsed - self.segment_start) / self.duration if self.duration > 0 else 1.0
+            if u >= 1.0:
+                self.finished = True
+
+        if self.finished:
+            self._arrive()
+            return
+
+        self.sampled_at = elapsed
+        current = self.current
+        velocity = self.velocity
+        for column, a, b, c, d in self.curves:
+            current[column] = ((a * u + b) * u + c) * u + d
+            velocity[column] = ((3.0 * a * u + 2.0 * b) * u + c) / self.duration
+        self.set_values(ENVIRONMENT_VECTORS.unpack(current, self.layout))
+        if self.milestones:
+            self._pass_milestones(now, u)
+
+    def _arrive(self):
+        if self.preset_id is None:
+            return
+        for column, target in self.targets.items():
+            self.current[column] = target
+        self.velocity = [0.0] * len(self.velocity)
+        ## everything that was targeted goes out once, the shadow state drops what didn't change
+        self.set_values(ENVIRONMENT_VECTORS.unpack(self.current, ENVIRONMENT_VECTORS.entries(self.targets)), exact=True)
+        if self.on_arrive:
+            self.on_arrive(self.preset_name)
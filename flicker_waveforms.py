@@ -0,0 +1,187 @@
+import bisect
+import random
+
+## seconds of waveform generated ahead of playback, the table grows in windows this long
+WAVEFORM_WINDOW = 10.0
+## breakpoints further behind playback than this are dropped when the table grows
+WAVEFORM_HISTORY = 2.0
+## seeds are drawn below this when a run doesn't get one, so they fit the ui's int field
+MAX_SEED = 2 ** 31 - 1
+## keyframes can't share a time, a baked jump becomes a ramp this long
+BAKE_JUMP_GAP = 0.001
+
+
+class _WaveformBuilder:
+    ## appends breakpoints, a jump is two breakpoints at the same time, a fade is a straight line
+
+    def __init__(self, times, levels):
+        self.times = times
+        self.levels = levels
+
+    @property
+    def end(self):
+        return self.times[-1]
+
+    @property
+    def level(self):
+        return self.levels[-1]
+
+    def jump(self, level):
+        if level != self.level:
+            self.times.append(self.end)
+            self.levels.append(level)
+
+    def fade(self, level, duration):
+        if duration <= 0:
+            self.jump(level)
+            return
+        self.times.append(self.end + duration)
+        self.levels.append(level)
+
+    def hold(self, duration):
+        if duration > 0:
+            self.times.append(self.end + duration)
+            self.levels.append(self.level)
+
+
+## one cycle of each preset, level 1.0 is full strength
+## on/off either jump or fade over delay, depending on easing
+
+def _switch(b, level, delay, eased):
+    if eased:
+        b.fade(level, delay)
+    else:
+        b.jump(level)
+
+
+def _pulse(b, delay, eased, rng):
+    _switch(b, 0.0, delay, eased)
+    b.hold(0 if eased else delay)
+    _switch(b, 1.0, delay, eased)
+    b.hold(0 if eased else delay)
+
+
+def _faulty(b, delay, eased, rng):
+    _switch(b, 1.0, delay, eased)
+    b.hold(rng.uniform(0.02, 0.2))
+    _switch(b, 0.0, delay, eased)
+    b.hold(rng.uniform(delay * 0.5, delay * 1.5))
+
+
+def _strobe(b, delay, eased, rng):
+    _switch(b, 1.0, delay, eased)
+    b.hold(0 if eased else 0.02)
+    _switch(b, 0.0, delay, eased)
+    b.hold(delay)
+
+
+def _storm(b, delay, eased, rng):
+    for _ in range(rng.randint(2, 4)):
+        _switch(b, 1.0, delay, eased)
+        b.hold(rng.uniform(0.02, 0.05))
+        _switch(b, 0.0, delay, eased)
+        b.hold(rng.uniform(0.02, 0.08))
+    b.hold(rng.uniform(3.0, 8.0))
+
+
+def _heartbeat(b, delay, eased, rng):
+    beat = 0 if eased else 0.1
+    _switch(b, 1.0, delay, eased)
+    b.hold(beat)
+    _switch(b, 0.0, delay, eased)
+    b.hold(beat)
+    _switch(b, 1.0, delay, eased)
+    b.hold(beat)
+    _switch(b, 0.0, delay, eased)
+    b.hold(delay)
+
+
+def _candle(b, delay, eased, rng):
+    b.fade(rng.uniform(0.7, 0.95), rng.uniform(delay * 0.8, delay * 1.2))
+
+
+def _steady(b, delay, eased, rng):
+    b.hold(WAVEFORM_WINDOW)
+
+
+FLICKER_WAVEFORMS = {
+    "Pulse": _pulse,
+    "Faulty": _faulty,
+    "Strobe": _strobe,
+    "Storm": _storm,
+    "Heartbeat": _heartbeat,
+    "Candle": _candle,
+}
+
+
+class FlickerWaveform:
+    ## (time, level) breakpoints of a flicker preset with straight lines between them,
+    ## generated a window ahead of playback and extended as playback reaches the end
+    ## every run draws from its own seeded generator, the same seed always gives the same flicker
+
+    def __init__(self, preset, delay, use_easing, seed=None):
+        self.cycle = FLICKER_WAVEFORMS.get(preset, _steady)
+        self.delay = delay
+        self.use_easing = use_easing
+        self.seed = seed if seed is not None else random.randrange(1, MAX_SEED)
+        self.rng = random.Random(self.seed)
+        self.times = [0.0]
+        self.levels = [1.0]
+        self.segment = 0  # segment of the last sample
+        self._extend(WAVEFORM_WINDOW)
+
+    def _extend(self, until):
+        builder = _WaveformBuilder(self.times, self.levels)
+        while builder.end < until:
+            end = builder.end
+            self.cycle(builder, self.delay, self.use_easing, self.rng)
+            if builder.end <= end:
+                ## a cycle has to take time, otherwise the table would never reach until
+                builder.hold(self.delay)
+
+    def _trim(self, t):
+        keep_from = bisect.bisect_right(self.times, t - WAVEFORM_HISTORY) - 1
+        if keep_from > 0:
+            del self.times[:keep_from]
+            del self.levels[:keep_from]
+            self.segment = max(self.segment - keep_from, 0)
+
+    def sample(self, t):
+        ## returns (level, seconds the level stays flat or 0, True if a breakpoint was passed since the last sample)
+        if t >= self.times[-1]:
+            self._trim(t)
+            self._extend(t + WAVEFORM_WINDOW)
+
+        times = self.times
+        i = self.segment
+        if not times[i] <= t < times[i + 1]:
+            i = bisect.bisect_right(times, t) - 1
+        passed = i != self.segment
+        self.segment = i
+
+        start, end = times[i], times[i + 1]
+        a, b = self.levels[i], self.levels[i + 1]
+        if a == b:
+            return a, end - t, passed
+        return a + (b - a) * (t - start) / (end - start), 0.0, passed
+
+    def keyframe_points(self, duration):
+        ## (time, level) for keyframes over [0, duration], call it on a waveform that hasn't been played
+        if self.times[-1] < duration:
+            self._extend(duration)
+        end = bisect.bisect_right(self.times, duration)
+        points = list(zip(self.times[:end], self.levels[:end]))
+        if points[-1][0] < duration:
+            last = points[-1]
+            next_time, next_level = self.times[end], self.levels[end]
+            points.append((duration, last[1] + (next_level - last[1]) * (duration - last[0]) / (next_time - last[0])))
+
+        baked = []
+        for t, level in points:
+            if baked and t - baked[-1][0] < BAKE_JUMP_GAP:
+                if t + BAKE_JUMP_GAP > duration:
+                    baked[-1] = (baked[-1][0], level)
+                    continue
+                t = baked[-1][0] + BAKE_JUMP_GAP
+            baked.append((t, level))
+        return baked
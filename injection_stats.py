@@ -0,0 +1,152 @@
+import csv
+import datetime
+import os
+import threading
+import time
+from collections import deque
+
+STATS_DIR = "stats"
+
+## upper bucket bounds in microseconds, the last bucket catches everything slower
+LATENCY_BUCKETS_US = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000)
+
+## injection phases, in the order they happen
+PHASES = ("allocate", "write", "ring_push", "remote_thread", "wait", "free", "total")
+
+
+class LatencyHistogram:
+    ## fixed buckets, recording never allocates
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_US) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        micros = seconds * 1e6
+        index = 0
+        for bound in LATENCY_BUCKETS_US:
+            if micros <= bound:
+                break
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += micros
+        if micros > self.max:
+            self.max = micros
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, fraction):
+        ## upper bound of the bucket the percentile falls in
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target:
+                return min(LATENCY_BUCKETS_US[index], self.max) if index < len(LATENCY_BUCKETS_US) else self.max
+        return self.max
+
+
+class RateCounter:
+    ## events per second per key over a sliding window of whole seconds
+
+    def __init__(self, window_seconds=5):
+        self.window_seconds = window_seconds
+        self.buckets = {}  # key -> deque of [second, count]
+        self.totals = {}
+
+    def add(self, key, amount=1, now=None):
+        second = int(now if now is not None else time.monotonic())
+        buckets = self.buckets.get(key)
+        if buckets is None:
+            buckets = self.buckets[key] = deque()
+        if buckets and buckets[-1][0] == second:
+            buckets[-1][1] += amount
+        else:
+            buckets.append([second, amount])
+            while buckets and buckets[0][0] <= second - self.window_seconds:
+                buckets.popleft()
+        self.totals[key] = self.totals.get(key, 0) + amount
+
+    def rates(self, now=None):
+        second = int(now if now is not None else time.monotonic())
+        result = {}
+        for key, buckets in self.buckets.items():
+            recent = sum(count for bucket_second, count in buckets if bucket_second > second - self.window_seconds)
+            result[key] = recent / self.window_seconds
+        return result
+
+
+class InjectionStats:
+    ## shared by MemoryManager and the backend, everything is guarded by one lock
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {phase: LatencyHistogram() for phase in PHASES}
+            self.dvar_rates = RateCounter()
+            self.caller_rates = RateCounter()
+            self.started = time.monotonic()
+
+    def record(self, phase, seconds):
+        with self.lock:
+            self.histograms[phase].record(seconds)
+
+    def record_command(self, command, source):
+        self.record_dvar(command.split(None, 1)[0].lower() if command else "", source)
+
+    def record_dvar(self, key, source):
+        now = time.monotonic()
+        with self.lock:
+            self.dvar_rates.add(key, now=now)
+            self.caller_rates.add(source, now=now)
+
+    def summary_text(self):
+        with self.lock:
+            lines = ["Latency (us)       count     mean      p50      p95      max"]
+            for phase in PHASES:
+                h = self.histograms[phase]
+                if h.count:
+                    lines.append(f"{phase:<16}{h.count:>8}{h.mean():>9.0f}{h.percentile(0.5):>9.0f}"
+                                 f"{h.percentile(0.95):>9.0f}{h.max:>9.0f}")
+
+            lines.append("")
+            lines.append("Commands/s by caller")
+            for key, rate in sorted(self.caller_rates.rates().items(), key=lambda item: -item[1]):
+                lines.append(f"  {key:<24}{rate:>8.1f}  (total {self.caller_rates.totals[key]})")
+
+            lines.append("")
+            lines.append("Commands/s by dvar")
+            for key, rate in sorted(self.dvar_rates.rates().items(), key=lambda item: -item[1]):
+                lines.append(f"  {key:<24}{rate:>8.1f}  (total {self.dvar_rates.totals[key]})")
+        return "\n".join(lines)
+
+    def export_csv(self, filename=None):
+        if filename is None:
+            stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"injection_stats_{stamp}.csv"
+        os.makedirs(STATS_DIR, exist_ok=True)
+        path = os.path.join(STATS_DIR, filename)
+
+        with self.lock, open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(["section", "key", "count", "mean_us", "p50_us", "p95_us", "max_us", "rate_per_s"])
+            for phase in PHASES:
+                h = self.histograms[phase]
+                writer.writerow(["latency", phase, h.count, f"{h.mean():.1f}", h.percentile(0.5),
+                                 h.percentile(0.95), f"{h.max:.1f}", ""])
+            for section, counter in (("caller", self.caller_rates), ("dvar", self.dvar_rates)):
+                for key, rate in counter.rates().items():
+                    writer.writerow([section, key, counter.totals[key], "", "", "", "", f"{rate:.2f}"])
+            writer.writerow(["latency_buckets_us", "upper_bounds"] + list(LATENCY_BUCKETS_US))
+            for phase in PHASES:
+                writer.writerow(["latency_buckets", phase] + self.histograms[phase].counts)
+        return path
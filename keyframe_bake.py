@@ -0,0 +1,128 @@
+import csv
+import datetime
+import math
+import os
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+BAKE_DIR = "bakes"
+BAKE_RATE = 60
+
+
+class BakedKeyframes:
+    ## dense sample table, row i holds every property at i / rate seconds
+    ## columns are laid out per property, colors take three columns
+
+    def __init__(self, columns, table, rate, duration, key_times=()):
+        self.columns = columns  # [(property, first column, width)]
+        self.table = table  # numpy array or list of rows
+        self.rate = rate
+        self.duration = duration
+        self.key_times = key_times
+        self.row_count = len(table)
+
+    def row_index(self, t):
+        return min(max(int(round(t * self.rate)), 0), self.row_count - 1)
+
+    def values_at(self, t):
+        row = self.table[self.row_index(t)]
+        if np is not None and isinstance(row, np.ndarray):
+            row = row.tolist()
+        return {prop: row[first] if width == 1 else row[first:first + width]
+                for prop, first, width in self.columns}
+
+    def export_csv(self, filename=None):
+        if filename is None:
+            stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"keyframes_{stamp}.csv"
+        os.makedirs(BAKE_DIR, exist_ok=True)
+        path = os.path.join(BAKE_DIR, filename)
+
+        header = ["time"]
+        for prop, first, width in self.columns:
+            header.extend([prop] if width == 1 else [f"{prop}_{i}" for i in range(width)])
+        rows = self.table.tolist() if np is not None and isinstance(self.table, np.ndarray) else self.table
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            for i, row in enumerate(rows):
+                writer.writerow([f"{i / self.rate:.4f}"] + [f"{v:.4f}" for v in row])
+        return path
+
+
+def _column_layout(compiled):
+    columns = []
+    first = 0
+    for prop, track in compiled.items:
+        width = len(track.values[0]) if isinstance(track.values[0], list) else 1
+        columns.append((prop, first, width))
+        first += width
+    return columns
+
+
+def _can_bake(compiled):
+    ## a step segment (mismatched values) has no place in a float table
+    return all(None not in track.easings for _, track in compiled.items)
+
+
+def bake_keyframes(compiled, duration, rate=BAKE_RATE):
+    ## returns None when the keyframes can't be baked, playback then evaluates live
+    if not compiled.items or not _can_bake(compiled):
+        return None
+
+    columns = _column_layout(compiled)
+    row_count = int(math.ceil(duration * rate)) + 1
+    if np is None:
+        table = []
+        for i in range(row_count):
+            row = []
+            for value in compiled.evaluate(i / rate).values():
+                if isinstance(value, list):
+                    row.extend(value)
+                else:
+                    row.append(value)
+            table.append(row)
+        return BakedKeyframes(columns, table, rate, duration, compiled.key_times)
+
+    sample_times = np.arange(row_count, dtype=np.float64) / rate
+    table = np.empty((row_count, sum(width for _, _, width in columns)), dtype=np.float64)
+    for (prop, first, width), (_, track) in zip(columns, compiled.items):
+        values = np.asarray(track.values, dtype=np.float64).reshape(len(track.values), width)
+        if len(track.times) == 1:
+            table[:, first:first + width] = values[0]
+            continue
+
+        times = np.asarray(track.times, dtype=np.float64)
+        segments = np.clip(np.searchsorted(times, sample_times, side='right') - 1, 0, len(times) - 2)
+        starts = times[segments]
+        progress = np.clip((sample_times - starts) / (times[segments + 1] - starts), 0.0, 1.0)
+
+        ## the easing functions are plain arithmetic, so each one runs once over all of its samples
+        eased = np.empty_like(progress)
+        easing_ids = {}
+        segment_easing = np.array([easing_ids.setdefault(easing, len(easing_ids)) for easing in track.easings])
+        sample_easing = segment_easing[segments]
+        for easing, easing_id in easing_ids.items():
+            mask = sample_easing == easing_id
+            if mask.any():
+                eased[mask] = easing(progress[mask])
+
+        prev_values = values[segments]
+        table[:, first:first + width] = prev_values + (values[segments + 1] - prev_values) * eased[:, None]
+
+        ## spline segments overwrite their samples with the cubic, one Horner pass for all of them
+        is_spline = np.array([spline is not None for spline in track.splines])
+        sample_spline = is_spline[segments]
+        if sample_spline.any():
+            coefficients = np.zeros((len(track.splines), 3, width), dtype=np.float64)
+            for i, spline in enumerate(track.splines):
+                if spline is not None:
+                    coefficients[i] = np.asarray(spline, dtype=np.float64).reshape(width, 3).T
+            coef = coefficients[segments[sample_spline]]
+            u = progress[sample_spline][:, None]
+            table[sample_spline, first:first + width] = (((coef[:, 0] * u + coef[:, 1]) * u + coef[:, 2]) * u
+                                                         + prev_values[sample_spline])
+    return BakedKeyframes(columns, table, rate, duration, compiled.key_times)
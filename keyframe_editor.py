@@ -2,6 +2,7 @@ import dearpygui.dearpygui as dpg
 import copy
 import math
 import time
+from keyframe_simplify import simplify_keyframes
 
 
 class SliderTimelineWidget:
@@ -311,10 +312,10 @@ class EnhancedKeyframeEditor:
         if prop_name in ["sun_direction_x", "sun_direction_y"]:
             x = dpg.get_value("kf_sun_direction_x")
             y = dpg.get_value("kf_sun_direction_y")
-            self.app.memory_manager.execute_command(f"r_lighttweaksundirection {x:.2f} {y:.2f}")
+            self.app.memory_manager.submit_command(f"r_lighttweaksundirection {x:.2f} {y:.2f}")
         elif prop_name in command_map:
             command = command_map[prop_name]
-            self.app.memory_manager.execute_command(f"{command} {app_data:.2f}")
+            self.app.memory_manager.submit_command(f"{command} {app_data:.2f}")
 
     def _sync_color_value(self, sender, app_data, user_data):
         prop_name = user_data
@@ -338,7 +339,7 @@ class EnhancedKeyframeEditor:
 
         if prop_name in command_map:
             command = command_map[prop_name]
-            self.app.memory_manager.execute_command(
+            self.app.memory_manager.submit_command(
                 f"{command} {rgb_internal[0]:.2f} {rgb_internal[1]:.2f} {rgb_internal[2]:.2f}")
 
     def _set_property_selection(self, selected_props):
@@ -534,6 +535,26 @@ class EnhancedKeyframeEditor:
         if updated_count > 0:
             self.app._execute_keyframe_action(keyframes_copy, f"Set {updated_count} keyframes to {app_data}")
 
+    def _simplify_keyframes(self):
+        if len(self.app.current_keyframes) < 3:
+            self.app._add_debug_message("Need at least 3 keyframes to simplify.", is_error=True)
+            return
+
+        tolerance = dpg.get_value("simplify_tolerance") if dpg.does_item_exist("simplify_tolerance") else 0.01
+        before = len(self.app.current_keyframes)
+        simplified = simplify_keyframes(self.app.current_keyframes, max(tolerance, 0.0))
+        ## properties are pruned one by one, a keyframe can lose some of its values and still stay
+        values_before = sum(v is not None for kf in self.app.current_keyframes for v in kf.get('values', {}).values())
+        values_after = sum(len(kf['values']) for kf in simplified)
+        if values_after == values_before:
+            self.app._add_debug_message(f"No keyframes can be removed within a tolerance of {tolerance:g}.")
+            return
+
+        self.app._execute_keyframe_action(simplified, f"Simplify Keyframes ({before} -> {len(simplified)})")
+        self.app._add_debug_message(f"Removed {before - len(simplified)} of {before} keyframes and "
+                                    f"{values_before - values_after} of {values_before} property values "
+                                    f"({(values_before - values_after) / values_before:.0%}), tolerance {tolerance:g}.")
+
     def _load_keyframe_template(self):
         template_name = dpg.get_value("keyframe_template_combo")
         if not template_name or template_name not in self.keyframe_templates:
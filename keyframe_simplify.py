@@ -0,0 +1,134 @@
+import copy
+from keyframe_tracks import SPLINE_EASING
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _simplify_numpy(times, values, tolerance):
+    t = np.asarray(times, dtype=np.float64)
+    v = np.asarray(values, dtype=np.float64).reshape(len(times), -1)
+    keep = np.zeros(len(times), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(times) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        span = t[last] - t[first]
+        progress = (t[first + 1:last] - t[first]) / span if span > 0 else np.zeros(last - first - 1)
+        line = v[first] + (v[last] - v[first]) * progress[:, None]
+        error = np.abs(v[first + 1:last] - line).max(axis=1)
+        i = int(error.argmax())
+        if error[i] > tolerance:
+            split = first + 1 + i
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return np.flatnonzero(keep).tolist()
+
+
+def _simplify_python(times, values, tolerance):
+    values = [v if isinstance(v, list) else [v] for v in values]
+    keep = [False] * len(times)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(times) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        t0, v0, v1 = times[first], values[first], values[last]
+        span = times[last] - t0
+        worst, split = -1.0, first
+        for i in range(first + 1, last):
+            progress = (times[i] - t0) / span if span > 0 else 0.0
+            error = max(abs(x - (a + (b - a) * progress)) for x, a, b in zip(values[i], v0, v1))
+            if error > worst:
+                worst, split = error, i
+        if worst > tolerance:
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return [i for i, kept in enumerate(keep) if kept]
+
+
+def simplify_indices(times, values, tolerance):
+    ## Ramer-Douglas-Peucker on the value error against a straight line between kept keys
+    ## colors are one point, the error is the largest component error
+    if len(times) <= 2:
+        return list(range(len(times)))
+    if np is not None:
+        return _simplify_numpy(times, values, tolerance)
+    return _simplify_python(times, values, tolerance)
+
+
+def _linear_runs(easings):
+    ## (first, last) key ranges joined only by Linear segments, the error against a straight line is
+    ## only the real error there, so only their inner keys can go. a spline segment next to a run takes
+    ## its tangent from the key one further into the run, that key has to stay as well
+    runs = []
+    first = 0
+    for i, easing in enumerate(easings):
+        if i < len(easings) - 1 and easing == "Linear":
+            continue
+        start, end = first, i
+        if start > 0 and easings[start - 1] == SPLINE_EASING:
+            start += 1
+        if easing == SPLINE_EASING:
+            end -= 1
+        if end - start >= 2:
+            runs.append((start, end))
+        first = i if easing == "Linear" else i + 1
+    return runs
+
+
+def _is_simplifiable(values):
+    first = values[0]
+    if isinstance(first, list):
+        width = len(first)
+        return all(type(v) is list and len(v) == width for v in values)
+    return all(type(v) in (int, float) for v in values)
+
+
+def simplify_keyframes(keyframes, tolerance):
+    ## each property is reduced on its own, a keyframe keeps the properties that survived at its time
+    ## and is dropped once none are left, the first and last key of every property always stay
+    ## only keys inside runs of Linear segments are candidates, eased and spline keys always stay
+    ordered = sorted(keyframes, key=lambda kf: kf['time'])
+    times = [kf['time'] for kf in ordered]
+    indices = {}  # property -> keyframe indices that set it
+    values = {}  # property -> its values at those keyframes
+    easings = {}  # property -> easing names of those keyframes
+    for index, kf in enumerate(ordered):
+        for prop, value in kf.get('values', {}).items():
+            if value is not None:
+                if prop not in indices:
+                    indices[prop] = []
+                    values[prop] = []
+                    easings[prop] = []
+                indices[prop].append(index)
+                values[prop].append(value)
+                easings[prop].append(kf.get('easing', 'Linear'))
+
+    kept = {}  # keyframe index -> properties that stay
+    for prop, prop_indices in indices.items():
+        prop_values = values[prop]
+        survivors = set(range(len(prop_indices)))
+        if _is_simplifiable(prop_values):
+            for first, last in _linear_runs(easings[prop]):
+                run = simplify_indices([times[i] for i in prop_indices[first:last + 1]],
+                                       prop_values[first:last + 1], tolerance)
+                survivors.difference_update(range(first, last + 1))
+                survivors.update(first + i for i in run)
+        for i in survivors:
+            kept.setdefault(prop_indices[i], set()).add(prop)
+
+    simplified = []
+    for index in sorted(kept):
+        props = kept[index]
+        new_kf = copy.deepcopy(ordered[index])
+        new_kf['values'] = {prop: value for prop, value in new_kf.get('values', {}).items() if prop in props}
+        simplified.append(new_kf)
+    return simplified
@@ -0,0 +1,152 @@
+import bisect
+
+## keyframe easing that fits a Catmull-Rom curve through the neighbouring keys instead of easing a lerp
+SPLINE_EASING = "Spline"
+
+
+def _linear(t):
+    return t
+
+
+def _tangent(times, values, i):
+    ## Catmull-Rom slope at key i (value per second), one-sided at the ends of the track
+    before = max(i - 1, 0)
+    after = min(i + 1, len(times) - 1)
+    span = times[after] - times[before]
+    if span <= 0:
+        return 0.0
+    return (values[after] - values[before]) / span
+
+
+def _hermite_coefficients(p0, p1, m0, m1, duration):
+    ## p(u) = ((a * u + b) * u + c) * u + p0 for u in [0, 1] across the segment
+    c = m0 * duration
+    d1 = m1 * duration
+    return 2.0 * (p0 - p1) + c + d1, 3.0 * (p1 - p0) - 2.0 * c - d1, c
+
+
+class KeyframeTrack:
+    ## one property: sorted key times, the value at each key and the easing towards the next key
+    ## an easing of None marks a segment that can't be interpolated (mismatched values), it snaps halfway
+    ## spline segments carry cubic coefficients instead, per component for colors
+
+    __slots__ = ("times", "values", "easings", "splines", "hint")
+
+    def __init__(self, times, values, easings, splines=None):
+        self.times = times
+        self.values = values
+        self.easings = easings
+        self.splines = splines or [None] * len(easings)  # (a, b, c) or a list of them, None for eased segments
+        self.hint = 0  # last used segment, playback mostly stays in it or moves to the next one
+
+    def segment(self, t):
+        ## index i with times[i] <= t < times[i + 1], t must be inside the track
+        times = self.times
+        i = self.hint
+        if i + 1 < len(times) and times[i] <= t < times[i + 1]:
+            return i
+        if i + 2 < len(times) and times[i + 1] <= t < times[i + 2]:
+            self.hint = i + 1
+            return i + 1
+        i = bisect.bisect_right(times, t) - 1
+        self.hint = i
+        return i
+
+    def evaluate(self, t):
+        times = self.times
+        if t <= times[0]:
+            return self._copy(self.values[0])
+        if t >= times[-1]:
+            return self._copy(self.values[-1])
+
+        i = self.segment(t)
+        start_time = times[i]
+        progress = (t - start_time) / (times[i + 1] - start_time)
+        prev_val = self.values[i]
+        next_val = self.values[i + 1]
+
+        spline = self.splines[i]
+        if spline is not None:
+            if isinstance(prev_val, list):
+                return [((a * progress + b) * progress + c) * progress + p
+                        for (a, b, c), p in zip(spline, prev_val)]
+            a, b, c = spline
+            return ((a * progress + b) * progress + c) * progress + prev_val
+
+        easing = self.easings[i]
+        if easing is None:
+            return self._copy(next_val if progress > 0.5 else prev_val)
+        eased_t = easing(progress)
+        if isinstance(prev_val, list):
+            return [a + (b - a) * eased_t for a, b in zip(prev_val, next_val)]
+        return prev_val + (next_val - prev_val) * eased_t
+
+    @staticmethod
+    def _copy(value):
+        return list(value) if isinstance(value, list) else value
+
+
+class CompiledKeyframes:
+    ## keyframes split into one track per property, built once per edit instead of on every frame
+
+    def __init__(self, keyframes, easing_functions):
+        ordered = sorted(keyframes, key=lambda kf: kf['time'])
+        self.start_time = ordered[0]['time'] if ordered else 0.0
+        self.end_time = ordered[-1]['time'] if ordered else 0.0
+        self.key_times = sorted({kf['time'] for kf in ordered})  # segment ends, for playback
+
+        keys = {}  # property -> [(time, value, easing name)]
+        for kf in ordered:
+            easing_name = kf.get('easing', 'Linear')
+            for prop, value in kf.get('values', {}).items():
+                if value is not None:
+                    keys.setdefault(prop, []).append((kf['time'], value, easing_name))
+
+        self.tracks = {}
+        for prop, prop_keys in keys.items():
+            times = [k[0] for k in prop_keys]
+            values = [k[1] for k in prop_keys]
+            easings = []
+            for i in range(len(prop_keys) - 1):
+                easings.append(easing_functions.get(prop_keys[i][2], _linear)
+                               if self._can_interpolate(values[i], values[i + 1]) else None)
+            splines = self._spline_segments(times, values, easings, [k[2] for k in prop_keys])
+            self.tracks[prop] = KeyframeTrack(times, values, easings, splines)
+        self.items = list(self.tracks.items())
+
+    @staticmethod
+    def _spline_segments(times, values, easings, easing_names):
+        ## coefficients are only fitted when a key asks for a spline and its values all have the same shape
+        splines = [None] * len(easings)
+        wanted = [i for i, name in enumerate(easing_names[:-1]) if name == SPLINE_EASING and easings[i] is not None]
+        if not wanted:
+            return splines
+        if isinstance(values[0], list):
+            width = len(values[0])
+            if any(not isinstance(v, list) or len(v) != width for v in values):
+                return splines
+            components = [[v[j] for v in values] for j in range(width)]
+        elif all(isinstance(v, (int, float)) for v in values):
+            components = None
+        else:
+            return splines
+
+        for i in wanted:
+            duration = times[i + 1] - times[i]
+            if components is None:
+                splines[i] = _hermite_coefficients(values[i], values[i + 1], _tangent(times, values, i),
+                                                   _tangent(times, values, i + 1), duration)
+            else:
+                splines[i] = [_hermite_coefficients(comp[i], comp[i + 1], _tangent(times, comp, i),
+                                                    _tangent(times, comp, i + 1), duration)
+                              for comp in components]
+        return splines
+
+    @staticmethod
+    def _can_interpolate(prev_val, next_val):
+        if isinstance(prev_val, (int, float)) and isinstance(next_val, (int, float)):
+            return True
+        return isinstance(prev_val, list) and isinstance(next_val, list) and len(prev_val) == len(next_val)
+
+    def evaluate(self, t):
+        return {prop: track.evaluate(t) for prop, track in self.items}
@@ -1,9 +1,9 @@
 import dearpygui.dearpygui as dpg
 import datetime
 import os
+import queue
 import sys
 import time
-import threading
 import copy
 import re
 
@@ -17,7 +17,11 @@ from history_manager import HistoryManager, ModifyKeyframesAction
 from hotkey_manager import HotkeyManager
 from action_manager import ActionManager
 from weather_presets import ENVIRONMENT_PRESETS, SEQUENCE_PRESETS
+from preset_vectors import ENVIRONMENT_VECTORS
+from environment_transition import EnvironmentTransition
 from keyframe_editor import EnhancedKeyframeEditor
+from keyframe_tracks import SPLINE_EASING
+from engine import EffectEngine
 from dynamic_theme_manager import DynamicThemeManager
 
 
@@ -37,36 +41,45 @@ class WAW_App_DPG:
         self.updating_fov = False
         self.debug_messages = []
         self.max_debug_lines = 100
+        self.ui_tasks = queue.SimpleQueue()  # work from other threads that has to run on the render thread
+        self.stats_refreshed_at = 0.0
         self.memory_manager = MemoryManager()
         self.memory_manager.set_debug_callback(self._add_debug_message)
         self._init_ui_vars_map()
-        self._check_initial_status()
+
+        ## every running effect is ticked by this one engine thread
+        self.engine = EffectEngine(lambda frame: self.sun_animator.emit_frame(frame), self._add_debug_message)
+        self.engine.start()
 
         self.sun_animator = SunAnimationSystem(
             self.memory_manager,
-            self._update_ui_from_animation
+            self._update_ui_from_animation,
+            self.engine
         )
-        self.sun_flicker = SunFlickerSystem(self.memory_manager)
+        self.sun_flicker = SunFlickerSystem(self.memory_manager, self.engine)
+
+        ## the watcher may attach at any moment, so only listen once everything the callback touches exists
+        self.memory_manager.set_status_callback(self._on_connection_changed)
+        self._check_initial_status()
+
         self.sequence_builder = SequenceBuilder(self, self._add_debug_message)
-        self.action_manager = ActionManager(self.memory_manager, self._add_debug_message)
+        self.action_manager = ActionManager(self.memory_manager, self._add_debug_message, self.engine)
 
         self.theme_manager = DynamicThemeManager(self)
 
         self.history_manager = HistoryManager(self)
         self.keyframe_clipboard = []
         self.current_keyframes = []
-        self.easing_options = ["Linear", "Smooth", "Ease-In", "Ease-Out"]
+        self.easing_options = ["Linear", "Smooth", "Ease-In", "Ease-Out", SPLINE_EASING]
         self.easing_functions = {
             "Linear": lambda t: t,
             "Smooth": SunAnimationSystem.ease_in_out_cubic,
             "Ease-In": SunAnimationSystem.ease_in_quad,
-            "Ease-Out": SunAnimationSystem.ease_out_quad
+            "Ease-Out": SunAnimationSystem.ease_out_quad,
+            ## spline segments are fitted when the keyframes are compiled, the lerp is only a fallback
+            SPLINE_EASING: lambda t: t
         }
 
-        self.is_transitioning = False
-        self.transition_thread = None
-        self.stop_transition = False
-
         self.enhanced_keyframe_editor = EnhancedKeyframeEditor(self)
 
         self.preset_manager = PresetManager()
@@ -134,7 +147,8 @@ class WAW_App_DPG:
                     dpg.set_value(tag, clamped_fov)
 
             if source != "animation":
-                self.memory_manager.execute_command(f"cg_fov {int(clamped_fov)}")
+                self.memory_manager.submit_command(f"cg_fov {int(clamped_fov)}", priority=source == "hotkey",
+                                                   source=source)
 
         finally:
             self.updating_fov = False
@@ -154,7 +168,7 @@ class WAW_App_DPG:
             kf_tag = f"kf_{prop_name}"
             if dpg.does_item_exist(kf_tag):
                 dpg.set_value(kf_tag, app_data)
-            self.memory_manager.execute_command(f"{command} {app_data:.2f}")
+            self.memory_manager.submit_command(f"{command} {app_data:.2f}")
 
     def _main_color_prop_cb(self, sender, app_data, user_data):
         if self.is_animating_keyframes:
@@ -168,7 +182,7 @@ class WAW_App_DPG:
         if dpg.does_item_exist(kf_tag):
             dpg.set_value(kf_tag, app_data)
 
-        self.memory_manager.execute_command(
+        self.memory_manager.submit_command(
             f"{command} {rgb_internal[0]:.2f} {rgb_internal[1]:.2f} {rgb_internal[2]:.2f}")
 
     def _main_sun_dir_cb(self, sender, app_data, user_data=None):
@@ -185,7 +199,7 @@ class WAW_App_DPG:
         if dpg.does_item_exist("kf_sun_direction_y"):
             dpg.set_value("kf_sun_direction_y", y)
 
-        self.memory_manager.execute_command(f"r_lighttweaksundirection {x:.2f} {y:.2f}")
+        self.memory_manager.submit_command(f"r_lighttweaksundirection {x:.2f} {y:.2f}")
 
     def _update_legacy_animation_controls(self):
         if dpg.does_item_exist("main_anim_target_x"):
@@ -218,6 +232,7 @@ class WAW_App_DPG:
             return
         action = ModifyKeyframesAction(self, self.current_keyframes, new_keyframes, description)
         self.history_manager.execute_action(action)
+        self.sun_animator.compile_keyframes(self.current_keyframes, self.easing_functions)
 
         self.enhanced_keyframe_editor.on_keyframes_changed()
 
@@ -246,10 +261,36 @@ class WAW_App_DPG:
         if dpg.does_item_exist("interactive_timeline_slider"):
             dpg.set_value("interactive_timeline_slider", app_data)
 
-        interpolated_values = self.sun_animator.interpolate_values_at_time(app_data, self.current_keyframes,
-                                                                           self.easing_functions)
+        baked = self._get_baked_keyframes() if self._bake_mode_enabled() else None
+        if baked is not None:
+            interpolated_values = baked.values_at(app_data)
+        else:
+            interpolated_values = self.sun_animator.interpolate_values_at_time(app_data, self.current_keyframes,
+                                                                               self.easing_functions)
         if interpolated_values:
-            self.sun_animator.update_all_properties(interpolated_values)
+            self.sun_animator.update_all_properties(interpolated_values, source="ui")
+
+    def _bake_mode_enabled(self):
+        return dpg.does_item_exist("keyframe_bake_mode") and dpg.get_value("keyframe_bake_mode")
+
+    def _get_baked_keyframes(self):
+        total_duration = dpg.get_value("keyframe_total_duration") if dpg.does_item_exist(
+            "keyframe_total_duration") else 10.0
+        return self.sun_animator.bake_keyframes(self.current_keyframes, total_duration, self.easing_functions)
+
+    def _export_baked_keyframes(self):
+        if len(self.current_keyframes) < 2:
+            self._add_debug_message("Need at least 2 keyframes to bake.", is_error=True)
+            return
+        baked = self._get_baked_keyframes()
+        if baked is None:
+            self._add_debug_message("Keyframes can't be baked (mismatched values).", is_error=True)
+            return
+        try:
+            path = baked.export_csv()
+            self._add_debug_message(f"Baked {baked.row_count} frames to {path}")
+        except OSError as e:
+            self._add_debug_message(f"Could not export baked keyframes: {e}", is_error=True)
 
     def _update_keyframe_list_ui(self):
         self.enhanced_keyframe_editor.update_keyframe_list()
@@ -328,76 +369,82 @@ class WAW_App_DPG:
                 else:
                     self._add_debug_message(f"  {prop}: {value:.2f}")
 
+    @property
+    def is_transitioning(self):
+        return self.engine.is_running("transition")
+
     def transition_to_environment(self, preset_name, duration_ms):
-        if self.is_transitioning:
-            self._add_debug_message("Another transition is already in progress.", is_error=True)
-            return
-        end_preset = self.environment_presets.get(preset_name)
-        if not end_preset:
+        ## a running transition is retargeted from where it is, other effects keep running
+        ## returns the transition, it completes once it arrives at its latest target
+        if ENVIRONMENT_VECTORS.get(preset_name) is None:
             self._add_debug_message(f"Target preset '{preset_name}' not found for transition.", is_error=True)
             return
-        self.stop_animation()
-        self.stop_transition = False
-        self.is_transitioning = True
-        self.transition_thread = threading.Thread(target=self._transition_worker, args=(end_preset, duration_ms))
-        self.transition_thread.daemon = True
-        self.transition_thread.start()
-
-    def _transition_worker(self, end_preset, duration_ms):
-        start_time = time.time()
         duration_s = duration_ms / 1000.0
-        start_state = self._get_all_keyframable_values()
-        frame_delay = 1.0 / 60.0
-        try:
-            preset_name = list(self.environment_presets.keys())[
-                list(self.environment_presets.values()).index(end_preset)]
-        except ValueError:
-            preset_name = "Unknown"
+        transition = self.engine.get("transition")
+        if isinstance(transition, EnvironmentTransition) and transition.retarget(preset_name, duration_s):
+            self._add_debug_message(f"Retargeting transition to '{preset_name}' over {duration_s}s.")
+            return transition
+
+        start_vector, _ = ENVIRONMENT_VECTORS.vectorise(self._get_all_keyframable_values())
+        transition = EnvironmentTransition(start_vector, on_arrive=self._transition_arrived)
+        transition.retarget(preset_name, duration_s)
+        self.engine.run("transition", transition)
         self._add_debug_message(f"Starting transition to '{preset_name}' over {duration_s}s.")
-        while not self.stop_transition:
-            elapsed = time.time() - start_time
-            if elapsed >= duration_s:
-                break
-            progress = SunAnimationSystem.ease_in_out_cubic(elapsed / duration_s)
-            interpolated_values = {}
-            for key, start_val in start_state.items():
-                if key in end_preset:
-                    end_val = end_preset[key]
-                    if isinstance(start_val, (float, int)):
-                        interpolated_values[key] = SunAnimationSystem.lerp(start_val, end_val, progress)
-                    elif isinstance(start_val, list):
-                        interpolated_values[key] = [SunAnimationSystem.lerp(start_val[i], end_val[i], progress) for i in
-                                                    range(len(start_val))]
-            self.sun_animator.update_all_properties(interpolated_values)
-            time.sleep(frame_delay)
-        if not self.stop_transition:
-            self.apply_environment_preset(preset_name)
-        self.is_transitioning = False
-        self._add_debug_message(f"Transition to '{preset_name}' finished.")
+        return transition
+
+    def _transition_arrived(self, preset_name):
+        ## called on the engine thread, the preset's effects start from the ui like any other
+        self.post_to_ui(self._start_preset_effects, preset_name)
+        self.post_to_ui(self._add_debug_message, f"Transition to '{preset_name}' finished.")
+
+    def post_to_ui(self, callback, *args):
+        self.ui_tasks.put((callback, args))
+
+    def run_ui_tasks(self):
+        ## called by the render loop before every frame
+        while True:
+            try:
+                callback, args = self.ui_tasks.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                callback(*args)
+            except Exception as e:
+                self._add_debug_message(f"UI task failed: {e}", is_error=True)
 
     def stop_animation(self):
         self.sun_animator.stop()
         self.sun_flicker.stop()
         self.sequence_builder.stop()
-        self.stop_transition = True
+        self.engine.stop("transition")
         self._set_keyframable_controls_state(enabled=True)
         self._add_debug_message(f"All effects stopped.")
 
-    def apply_environment_preset(self, preset_name):
-        self.stop_animation()
+    def apply_environment_preset(self, preset_name, stop_effects=True):
+        ## sequences apply presets with stop_effects=False, stopping would end the sequence itself
+        if stop_effects:
+            self.stop_animation()
         preset = self.environment_presets.get(preset_name)
-        if not preset:
+        preset_id = ENVIRONMENT_VECTORS.get(preset_name)
+        if not preset or preset_id is None:
             self._add_debug_message(f"Environment preset '{preset_name}' not found", is_error=True)
             return
-        self.sun_animator.update_all_properties(preset)
+        self.sun_animator.update_all_properties(ENVIRONMENT_VECTORS.values(preset_id), source="preset")
+        self._start_preset_effects(preset_name)
+        self._add_debug_message(f"Applied environment: {preset_name}")
+
+        if hasattr(self, 'enhanced_keyframe_editor'):
+            self.enhanced_keyframe_editor.timeline_widget.update_timeline()
+
+    def _start_preset_effects(self, preset_name):
+        ## flicker and animation that come with an environment preset
+        preset = self.environment_presets[preset_name]
         if "flicker" in preset:
             flicker_data = preset["flicker"]
-            if dpg.does_item_exist("flicker_preset_combo"):
-                dpg.set_value("flicker_preset_combo", flicker_data.get("preset", "Pulse"))
-            if dpg.does_item_exist("flicker_speed_ms"):
-                dpg.set_value("flicker_speed_ms", flicker_data.get("speed", 500))
-            if dpg.does_item_exist("flicker_use_easing"):
-                dpg.set_value("flicker_use_easing", flicker_data.get("easing", True))
+            self._set_flicker_control("flicker_preset_combo", flicker_data.get("preset", "Pulse"))
+            self._set_flicker_control("flicker_speed_ms", flicker_data.get("speed", 500))
+            self._set_flicker_control("flicker_use_easing", flicker_data.get("easing", True))
+            self._set_flicker_control("flicker_seed", flicker_data.get("seed", 0))
             self.start_flicker()
         if "animation" in preset:
             anim_data = preset["animation"]
@@ -405,10 +452,6 @@ class WAW_App_DPG:
             if anim_preset_name:
                 self.apply_anim_preset(None, anim_preset_name)
                 self.start_animation()
-        self._add_debug_message(f"Applied environment: {preset_name}")
-
-        if hasattr(self, 'enhanced_keyframe_editor'):
-            self.enhanced_keyframe_editor.timeline_widget.update_timeline()
 
     def _start_legacy_animation(self):
         try:
@@ -519,16 +562,18 @@ class WAW_App_DPG:
                 return
 
             self._add_debug_message("=== STARTING KEYFRAME ANIMATION ===")
-            self.sun_animator.animate_from_keyframes(
+            animation = self.sun_animator.animate_from_keyframes(
                 self.current_keyframes,
                 total_duration,
                 self.easing_functions,
-                on_complete=on_complete
+                on_complete=on_complete,
+                baked=self._bake_mode_enabled()
             )
 
             self._add_debug_message(
                 f"SUCCESS: Keyframe animation started - {len(self.current_keyframes)} keyframes over {total_duration}s"
             )
+            return animation
 
         except Exception as e:
             self._set_keyframable_controls_state(enabled=True)
@@ -564,40 +609,88 @@ class WAW_App_DPG:
                     dpg.set_value("orbital_rev_duration", preset_data.get("rev_duration", 30))
                     dpg.set_value("orbital_direction", preset_data.get("direction", "Counter-Clockwise"))
 
+    def _get_flicker_settings(self):
+        speed = None
+        if dpg.does_item_exist("flicker_speed_ms"):
+            speed = dpg.get_value("flicker_speed_ms")
+        elif dpg.does_item_exist("main_flicker_speed_ms"):
+            speed = dpg.get_value("main_flicker_speed_ms")
+
+        if speed is None:
+            speed = 500
+            self._add_debug_message("Warning: Flicker speed not found, using default 500ms", is_error=False)
+
+        preset_name = "Pulse"
+        if dpg.does_item_exist("flicker_preset_combo"):
+            preset_name = dpg.get_value("flicker_preset_combo") or "Pulse"
+        elif dpg.does_item_exist("main_flicker_preset_combo"):
+            preset_name = dpg.get_value("main_flicker_preset_combo") or "Pulse"
+
+        use_easing = True
+        if dpg.does_item_exist("flicker_use_easing"):
+            use_easing = dpg.get_value("flicker_use_easing")
+        elif dpg.does_item_exist("main_flicker_use_easing"):
+            use_easing = dpg.get_value("main_flicker_use_easing")
+
+        ## 0 draws a new seed for every run
+        seed = 0
+        if dpg.does_item_exist("flicker_seed"):
+            seed = dpg.get_value("flicker_seed")
+        elif dpg.does_item_exist("main_flicker_seed"):
+            seed = dpg.get_value("main_flicker_seed")
+
+        return speed, preset_name, use_easing, seed or None
+
+    @staticmethod
+    def _set_flicker_control(tag, value):
+        ## same lookup as _get_flicker_settings, the controls on the main tab carry a main_ prefix
+        for candidate in (tag, f"main_{tag}"):
+            if dpg.does_item_exist(candidate):
+                dpg.set_value(candidate, value)
+                return
+
     def start_flicker(self):
         try:
             if not self.memory_manager.is_connected():
                 return
 
             strength = self.ui_vars["doubles"]["sun_strength"]
+            speed, preset_name, use_easing, seed = self._get_flicker_settings()
+            flicker = self.sun_flicker.start(strength, speed, preset=preset_name, use_easing=use_easing, seed=seed)
+            self._add_debug_message(f"'{preset_name}' flicker started (seed {self.sun_flicker.last_seed}).")
+            return flicker
 
-            speed = None
-            if dpg.does_item_exist("flicker_speed_ms"):
-                speed = dpg.get_value("flicker_speed_ms")
-            elif dpg.does_item_exist("main_flicker_speed_ms"):
-                speed = dpg.get_value("main_flicker_speed_ms")
-
-            if speed is None:
-                speed = 500
-                self._add_debug_message("Warning: Flicker speed not found, using default 500ms", is_error=False)
-
-            preset_name = "Pulse"
-            if dpg.does_item_exist("flicker_preset_combo"):
-                preset_name = dpg.get_value("flicker_preset_combo") or "Pulse"
-            elif dpg.does_item_exist("main_flicker_preset_combo"):
-                preset_name = dpg.get_value("main_flicker_preset_combo") or "Pulse"
+        except Exception as e:
+            self._add_debug_message(f"Error starting flicker: {e}", is_error=True)
 
-            use_easing = True
-            if dpg.does_item_exist("flicker_use_easing"):
-                use_easing = dpg.get_value("flicker_use_easing")
-            elif dpg.does_item_exist("main_flicker_use_easing"):
-                use_easing = dpg.get_value("main_flicker_use_easing")
+    def _bake_flicker_to_keyframes(self):
+        ## writes the flicker into the sun_strength keys of the timeline, scaled by the strength it had there
+        speed, preset_name, use_easing, seed = self._get_flicker_settings()
+        duration = dpg.get_value("keyframe_total_duration") if dpg.does_item_exist("keyframe_total_duration") else 10.0
+        waveform = self.sun_flicker.create_waveform(speed, preset_name, use_easing, seed)
 
-            self.sun_flicker.start(strength, speed, preset=preset_name, use_easing=use_easing)
-            self._add_debug_message(f"'{preset_name}' flicker started.")
+        strength_track = self.sun_animator.compile_keyframes(
+            self.current_keyframes, self.easing_functions).tracks.get("sun_strength")
+        base_strength = self.ui_vars["doubles"]["sun_strength"]
 
-        except Exception as e:
-            self._add_debug_message(f"Error starting flicker: {e}", is_error=True)
+        keyframes_copy = copy.deepcopy(self.current_keyframes)
+        for kf in keyframes_copy:
+            kf.get('values', {}).pop("sun_strength", None)
+        keyframes_copy = [kf for kf in keyframes_copy if kf.get('values')]
+        by_time = {kf['time']: kf for kf in keyframes_copy}
+
+        for t, level in waveform.keyframe_points(duration):
+            t = round(t, 4)
+            base = strength_track.evaluate(t) if strength_track else base_strength
+            kf = by_time.get(t)
+            if kf is None:
+                kf = {"time": t, "easing": "Linear", "selected": False, "values": {}}
+                by_time[t] = kf
+                keyframes_copy.append(kf)
+            kf['values']["sun_strength"] = base * level
+
+        keyframes_copy.sort(key=lambda k: k['time'])
+        self._execute_keyframe_action(keyframes_copy, f"Bake '{preset_name}' Flicker (seed {waveform.seed})")
 
     def stop_flicker(self):
         if self.sun_flicker.is_flickering:
@@ -628,6 +721,22 @@ class WAW_App_DPG:
         if dpg.does_item_exist("debug_text"):
             dpg.set_value("debug_text", "Debug console cleared.")
 
+    def refresh_stats(self):
+        ## called by the render loop, redraws twice a second and only while the stats header is open
+        now = time.perf_counter()
+        if now - self.stats_refreshed_at < 0.5:
+            return
+        self.stats_refreshed_at = now
+        if dpg.is_item_visible("injection_stats_text"):
+            dpg.set_value("injection_stats_text", self.memory_manager.stats_summary_text())
+
+    def _export_injection_stats(self):
+        try:
+            path = self.memory_manager.stats.export_csv()
+            self._add_debug_message(f"Injection stats exported to {path}")
+        except OSError as e:
+            self._add_debug_message(f"Could not export injection stats: {e}", is_error=True)
+
     def _init_ui_vars_map(self):
         self.ui_vars = {"doubles": {}, "booleans": {}, "colors": {}, "integers": {}}
         defaults = MEMORY_MAP["defaults"]
@@ -647,12 +756,24 @@ class WAW_App_DPG:
         else:
             self.status_message, self.status_color = self.memory_manager.status_message, (255, 0, 0)
 
+    def _on_connection_changed(self, connected, message):
+        ## published by the process watcher thread whenever the game appears or exits
+        self.post_to_ui(self._show_connection_status, connected, message)
+
+    def _show_connection_status(self, connected, message):
+        self.status_message = message
+        self.status_color = (0, 255, 0) if connected else (255, 0, 0)
+        if dpg.does_item_exist("status_text"):
+            dpg.set_value("status_text", message)
+            dpg.configure_item("status_text", color=self.status_color)
+        self._add_debug_message(message, is_error=not connected)
+
     def _apply_config_to_ui(self, config_data):
         ui_data = config_data.get("ui", {})
         for category, values in ui_data.items():
             if category in self.ui_vars:
                 self.ui_vars[category].update(values)
-        self.sun_animator.update_all_properties(self._get_all_keyframable_values())
+        self.sun_animator.update_all_properties(self._get_all_keyframable_values(), source="ui")
         for key, value in self.ui_vars["booleans"].items():
             if dpg.does_item_exist(f"{key}_bool"):
                 dpg.set_value(f"{key}_bool", value)
@@ -682,25 +803,25 @@ class WAW_App_DPG:
     def _on_demo_selected(self, sender, demo_name):
         if demo_name:
             command = f"demo {demo_name}"
-            self.memory_manager.execute_command(command)
+            self.memory_manager.submit_command(command, priority=True)
             self._add_debug_message(f"Executing: {command}")
 
     def _bool_prop_cb(self, sender, app_data, user_data):
         prop_name, command = user_data
         self.ui_vars["booleans"][prop_name] = app_data
-        self.memory_manager.execute_command(f"{command} {int(app_data)}")
+        self.memory_manager.submit_command(f"{command} {int(app_data)}", priority=True)
 
     def _toggle_hud_cb(self, sender, app_data, user_data):
         self.hud_visible = not self.hud_visible
         value = 1 if self.hud_visible else 0
-        self.memory_manager.execute_command(f"cg_draw2d {value}")
+        self.memory_manager.submit_command(f"cg_draw2d {value}", priority=True)
         self._add_debug_message(f"HUD {'enabled' if self.hud_visible else 'disabled'}.")
 
     def _filmtweaks_cb(self, sender, app_data):
         value = int(app_data)
         self.ui_vars["booleans"]["filmtweaks_enabled"] = app_data
-        self.memory_manager.execute_command(f"r_filmtweakenable {value}")
-        self.memory_manager.execute_command(f"r_filmusetweaks {value}")
+        self.memory_manager.submit_command(f"r_filmtweakenable {value}", priority=True)
+        self.memory_manager.submit_command(f"r_filmusetweaks {value}", priority=True)
 
     def _float_prop_cb(self, sender, app_data, user_data):
         if self.is_animating_keyframes:
@@ -712,7 +833,7 @@ class WAW_App_DPG:
             self._safe_update_fov_ui(app_data, source="manual")
         else:
             self.ui_vars["doubles"][prop_name] = app_data
-            self.memory_manager.execute_command(f"{command} {app_data:.2f}")
+            self.memory_manager.submit_command(f"{command} {app_data:.2f}")
 
     def _color_prop_cb(self, sender, app_data, user_data):
         if self.is_animating_keyframes:
@@ -721,7 +842,7 @@ class WAW_App_DPG:
         prop_name, command = user_data
         rgb_internal = [c * 2.0 for c in app_data[:3]]
         self.ui_vars["colors"][prop_name] = rgb_internal
-        self.memory_manager.execute_command(
+        self.memory_manager.submit_command(
             f"{command} {rgb_internal[0]:.2f} {rgb_internal[1]:.2f} {rgb_internal[2]:.2f}")
 
     def _sun_dir_cb(self, sender, app_data, user_data=None):
@@ -732,7 +853,7 @@ class WAW_App_DPG:
         y = dpg.get_value("sun_direction_y")
         self.ui_vars["doubles"]["sun_direction_x"] = x
         self.ui_vars["doubles"]["sun_direction_y"] = y
-        self.memory_manager.execute_command(f"r_lighttweaksundirection {x:.2f} {y:.2f}")
+        self.memory_manager.submit_command(f"r_lighttweaksundirection {x:.2f} {y:.2f}")
 
     def update_hotkey_tab_ui(self):
         if dpg.does_item_exist("hotkey_table"):
@@ -785,15 +906,17 @@ class WAW_App_DPG:
             dpg.add_text("Console")
             with dpg.group(horizontal=True):
                 dpg.add_input_text(label="", tag="console_input", width=200, on_enter=True,
-                                   callback=lambda s, d, u: self.memory_manager.execute_command(d.lstrip('/')))
-                dpg.add_button(label="Send", callback=lambda: self.memory_manager.execute_command(
-                    dpg.get_value("console_input").lstrip('/')))
+                                   callback=lambda s, d, u: self.memory_manager.submit_command(d.lstrip('/'),
+                                                                                                priority=True,
+                                                                                                source="console"))
+                dpg.add_button(label="Send", callback=lambda: self.memory_manager.submit_command(
+                    dpg.get_value("console_input").lstrip('/'), priority=True, source="console"))
 
             with dpg.group(horizontal=True):
                 def timescale_callback(s, d, u):
                     try:
                         val = float(d)
-                        self.memory_manager.execute_command(f"timescale {val}")
+                        self.memory_manager.submit_command(f"timescale {val}", priority=True, source="console")
                     except (ValueError, TypeError):
                         self._add_debug_message(f"Invalid timescale value: {d}", is_error=True)
 
@@ -853,14 +976,14 @@ class WAW_App_DPG:
                         dpg.add_slider_int(label="Color Map", tag="color_map", width=50,
                                            default_value=self.ui_vars["integers"]["color_map"], min_value=0,
                                            max_value=4,
-                                           callback=lambda s, d: self.memory_manager.execute_command(f"r_colormap {d}"))
+                                           callback=lambda s, d: self.memory_manager.submit_command(f"r_colormap {d}"))
                         dpg.add_slider_int(label="Light Map", tag="light_map", width=50,
                                            default_value=self.ui_vars["integers"]["light_map"], min_value=0,
                                            max_value=4,
-                                           callback=lambda s, d: self.memory_manager.execute_command(f"r_lightmap {d}"))
+                                           callback=lambda s, d: self.memory_manager.submit_command(f"r_lightmap {d}"))
                         dpg.add_slider_int(label="Debug Shader", tag="debug_shader", width=50,
                                            default_value=self.ui_vars["integers"]["debug_shader"], min_value=0,
-                                           max_value=4, callback=lambda s, d: self.memory_manager.execute_command(
+                                           max_value=4, callback=lambda s, d: self.memory_manager.submit_command(
                                 f"r_debugshader {d}"))
                     dpg.add_separator()
                     dpg.add_text("Light/Dark Tints", color=(255, 255, 0))
@@ -993,9 +1116,12 @@ class WAW_App_DPG:
                     dpg.add_checkbox(label="Smoothing", tag="main_flicker_use_easing", default_value=True)
                     dpg.add_slider_int(label="Speed / Fade (ms)", tag="main_flicker_speed_ms", default_value=100,
                                        min_value=10, max_value=2000, width=200)
+                    dpg.add_input_int(label="Seed (0 = random)", tag="main_flicker_seed", default_value=0,
+                                      min_value=0, min_clamped=True, width=200)
                     with dpg.group(horizontal=True):
                         dpg.add_button(label="Start Flicker", callback=self.start_flicker)
                         dpg.add_button(label="Stop Flicker", callback=self.stop_flicker)
+                        dpg.add_button(label="Bake to Keyframes", callback=self._bake_flicker_to_keyframes)
 
                 dpg.add_tab(label="|")
 
@@ -1088,6 +1214,10 @@ class WAW_App_DPG:
                         )
                         dpg.add_text("seconds")
 
+                    with dpg.group(horizontal=True):
+                        dpg.add_checkbox(label="Bake before playback", tag="keyframe_bake_mode", default_value=False)
+                        dpg.add_button(label="Export Baked CSV", callback=self._export_baked_keyframes)
+
                     dpg.add_text("Timeline", color=(255, 255, 0))
                     self.enhanced_keyframe_editor.timeline_widget.create_timeline("keyframing_tab")
 
@@ -1105,13 +1235,19 @@ class WAW_App_DPG:
 
                     with dpg.group(horizontal=True):
                         dpg.add_combo(label="Easing", tag="bulk_easing_combo",
-                                      items=["Linear", "Smooth", "Ease-In", "Ease-Out"],
+                                      items=self.easing_options,
                                       callback=self.enhanced_keyframe_editor._apply_bulk_easing, width=120)
                         dpg.add_button(label="Reverse Selected",
                                        callback=self.enhanced_keyframe_editor._reverse_selected_keyframes, width=115)
                         dpg.add_button(label="Distribute Evenly",
                                        callback=self.enhanced_keyframe_editor._distribute_keyframes_evenly, width=115)
 
+                    with dpg.group(horizontal=True):
+                        dpg.add_input_float(label="Tolerance", tag="simplify_tolerance", default_value=0.01,
+                                            min_value=0.0, min_clamped=True, step=0.01, format="%.3f", width=120)
+                        dpg.add_button(label="Simplify Keyframes",
+                                       callback=self.enhanced_keyframe_editor._simplify_keyframes, width=140)
+
                     with dpg.group(horizontal=True):
                         dpg.add_combo(label="Template", tag="keyframe_template_combo",
                                       items=list(self.enhanced_keyframe_editor.keyframe_templates.keys()), width=150)
@@ -1284,6 +1420,11 @@ class WAW_App_DPG:
                     refresh_list()
 
                 with dpg.tab(label="Debug"):
+                    with dpg.collapsing_header(label="Injection Stats", default_open=False):
+                        with dpg.group(horizontal=True):
+                            dpg.add_button(label="Export CSV", callback=self._export_injection_stats)
+                            dpg.add_button(label="Reset", callback=lambda: self.memory_manager.stats.reset())
+                        dpg.add_text("No commands sent yet.", tag="injection_stats_text")
                     with dpg.group(horizontal=True):
                         dpg.add_text("Debug Console")
                         dpg.add_button(label="Clear", callback=self._clear_debug_console)
@@ -1411,5 +1552,10 @@ if __name__ == "__main__":
     dpg.set_primary_window("Primary Window", True)
     dpg.setup_dearpygui()
     dpg.show_viewport()
-    dpg.start_dearpygui()
+    while dpg.is_dearpygui_running():
+        app.run_ui_tasks()
+        app.refresh_stats()
+        dpg.render_dearpygui_frame()
+    app.engine.shutdown()
+    app.memory_manager.close()
     dpg.destroy_context()
\ No newline at end of file
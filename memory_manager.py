@@ -1,49 +1,95 @@
-import pymem
-import pymem.process
-import ctypes
-import psutil
-from constants import GAME_PROFILES
+import os
+import threading
+import time
+from command_backends import create_backend
+from command_queue import CommandQueue
+from process_watcher import ProcessWatcher
+from injection_stats import InjectionStats
+from constants import MEMORY_MAP
+
+## pymem talks to the game, recording keeps commands in memory (WAW_CONSOLE_BACKEND=recording)
+DEFAULT_BACKEND = os.environ.get("WAW_CONSOLE_BACKEND", "pymem")
+
+## dvars whose last sent value is tracked so unchanged writes can be skipped
+SHADOWED_DVARS = {dvar.lower() for dvar in MEMORY_MAP["dvars"]}
+## commands after which the game's dvar state no longer matches what we sent
+SHADOW_RESET_COMMANDS = {"demo", "map", "devmap", "map_restart", "vid_restart", "exec"}
 
 
 ## memory manager
 class MemoryManager:
-    def __init__(self):
-        self.pm = None
-        self.module_base = None
+    def __init__(self, backend=None):
         self.debug_callback = None
-        self.connected_game_profile = None  # stores detected game profile
-        self.status_message = "No supported game found."
-        self.auto_connect()
+        self.status_callback = None
+        self.backend = create_backend(backend or DEFAULT_BACKEND, self._debug)
+        self.stats = InjectionStats()
+        self.backend.stats = self.stats
+        self.shadow = {}  # dvar -> argument text of the last write
+        self.shadow_lock = threading.Lock()
+        self.suppressed_count = 0
+        self.command_queue = CommandQueue(self.execute_commands, self._debug, drop_callback=self._forget_shadow)
+        self.command_queue.start()
+
+        ## attaching to the game happens in the background, startup never waits for process enumeration
+        self.watcher = None
+        if self.backend.watch_process:
+            self.watcher = ProcessWatcher(self)
+            self.watcher.start()
+        else:
+            self.auto_connect()
 
-    def find_running_game(self):
+    @property
+    def connected_game_profile(self):
+        return self.backend.connected_game_profile
 
-        running_processes = {p.name() for p in psutil.process_iter(['name'])}
-        for process_name, profile in GAME_PROFILES.items():
-            if process_name in running_processes:
-                return process_name, profile  # # return the first match
-        return None, None
+    @property
+    def status_message(self):
+        return self.backend.status_message
 
     def auto_connect(self):
-        ## attempts to connect to game
-        process_name, profile = self.find_running_game()
-
-        if not process_name:
-            self._debug("No supported game found.", is_error=True)
-            self.status_message = "No supported game found."
-            return
-
-        try:
-            self.pm = pymem.Pymem(process_name)
-            self.module_base = pymem.process.module_from_name(self.pm.process_handle, process_name).lpBaseOfDll
-            self.connected_game_profile = profile
-            self.status_message = f"Connected to {profile['friendly_name']}"
-            self._debug(f"Successfully connected to {process_name} - Base: {hex(self.module_base)}")
-        except (pymem.exception.ProcessNotFound, AttributeError) as e:
-            self._debug(f"Failed to connect to {process_name}: {e}", is_error=True)
-            self.status_message = f"Error connecting to {process_name}."
-            self.pm = None
-            self.module_base = None
-            self.connected_game_profile = None
+        self.invalidate_shadow()
+        return self.backend.connect()
+
+    def set_status_callback(self, callback):
+        ## callback(connected, status_message), called from the watcher thread on every state change
+        self.status_callback = callback
+
+    def publish_status(self):
+        if self.status_callback:
+            self.status_callback(self.is_connected(), self.status_message)
+
+    def invalidate_shadow(self):
+        ## call whenever the game may have changed dvars behind our back (reconnect, demo/map load)
+        with self.shadow_lock:
+            self.shadow.clear()
+
+    def _forget_shadow(self, key):
+        with self.shadow_lock:
+            self.shadow.pop(key, None)
+
+    def _is_redundant(self, command):
+        ## records the command in the shadow state, True if it would not change anything
+        parts = command.split(None, 1)
+        key = parts[0].lower()
+        if key not in SHADOWED_DVARS:
+            if key in SHADOW_RESET_COMMANDS:
+                self.invalidate_shadow()
+            return False
+        return self._is_unchanged(key, parts[1] if len(parts) > 1 else "")
+
+    def _is_unchanged(self, key, args):
+        with self.shadow_lock:
+            if self.shadow.get(key) == args:
+                self.suppressed_count += 1
+                return True
+            self.shadow[key] = args
+        return False
+
+    def close(self):
+        if self.watcher:
+            self.watcher.stop()
+        self.command_queue.stop()
+        self.backend.disconnect()
 
     def set_debug_callback(self, callback):
         self.debug_callback = callback
@@ -54,39 +100,73 @@ class MemoryManager:
         print(f"{'[ERROR]' if is_error else '[INFO]'} {message}")
 
     def is_connected(self):
-        return self.pm is not None and self.connected_game_profile is not None
+        return self.backend.is_connected()
 
-    def execute_command(self, command: str, value: int = 0):
+    def set_dvars(self, writes, source="animator"):
+        ## writes: (dvar, values, argument text) for dvars from MEMORY_MAP - unchanged values are skipped,
+        ## the rest is queued as one batch
         if not self.is_connected():
             return
+        commands = []
+        for dvar_name, values, args in writes:
+            if self._is_unchanged(dvar_name, args):
+                continue
+            self.stats.record_dvar(dvar_name, source)
+            commands.append(f"{dvar_name} {args}")
+        if commands:
+            self.command_queue.submit_many(commands)
+
+    def submit_command(self, command, priority=False, source="ui"):
+        ## non-blocking, the injector thread sends it with the next batch
+        ## priority commands are interactive and always go out, but still update the shadow state
+        ## source names the caller for the per-caller rate counters
+        if not self.is_connected() or not command:
+            return
+        if self._is_redundant(command) and not priority:
+            return
+        self.stats.record_command(command, source)
+        self.command_queue.submit(command, priority)
 
-        # use the cbuf_addtext addresse from the detected game profile
-        cbuf_addtext_offset = self.connected_game_profile['cbuf_addtext']
-
-        command_bytes = (command + "\n").encode('ascii') + b'\x00'
-        command_addr = self.pm.allocate(len(command_bytes))
-        self.pm.write_bytes(command_addr, command_bytes, len(command_bytes))
-
-        shellcode = (
-                b"\xB8" + command_addr.to_bytes(4, 'little') +
-                b"\xB9" + value.to_bytes(4, 'little') +
-                b"\xBA" + cbuf_addtext_offset.to_bytes(4, 'little') +  # dynamic address
-                b"\xFF\xD2" +
-                b"\xC3"
-        )
+    def stats_summary_text(self):
+        ## injection stats plus what the shadow state and the queue did to the writes before they reached the backend
+        return (f"Unchanged writes skipped: {self.suppressed_count}\n"
+                f"Queued writes coalesced: {self.command_queue.coalesced_count}   "
+                f"dropped: {self.command_queue.dropped_count}\n\n" + self.stats.summary_text())
 
-        shellcode_addr = self.pm.allocate(len(shellcode))
-        self.pm.write_bytes(shellcode_addr, shellcode, len(shellcode))
+    def execute_command(self, command: str, value: int = 0):
+        if not self.is_connected():
+            return
 
-        thread_handle = ctypes.windll.kernel32.CreateRemoteThread(
-            self.pm.process_handle, None, 0, shellcode_addr, None, 0, None
-        )
+        self._inject((command + "\n").encode('ascii') + b'\x00', value)
 
-        if thread_handle:
-            ctypes.windll.kernel32.WaitForSingleObject(thread_handle, 0xFFFFFFFF)
-            ctypes.windll.kernel32.CloseHandle(thread_handle)
-        else:
-            self._debug("Failed to create remote thread.", is_error=True)
+    def _inject(self, command_bytes, value=0):
+        started = time.perf_counter()
+        delivered = self.backend.inject(command_bytes, value)
+        self.stats.record("total", time.perf_counter() - started)
+        return delivered
 
-        self.pm.free(command_addr)
-        self.pm.free(shellcode_addr)
\ No newline at end of file
+    def execute_commands(self, commands):
+        ## joins a whole frame of commands into as few cbuf_addtext calls as the buffer limit allows,
+        ## returns the commands the backend dropped
+        if not self.is_connected():
+            return []
+
+        limit = self.backend.max_chunk_size()
+        dropped = []
+        chunk = bytearray()
+        chunk_commands = []
+        for command in commands:
+            if not command:
+                continue
+            line = (command + "\n").encode('ascii')
+            if chunk and len(chunk) + len(line) + 1 > limit:
+                if not self._inject(bytes(chunk) + b'\x00'):
+                    dropped.extend(chunk_commands)
+                chunk.clear()
+                chunk_commands.clear()
+            chunk += line
+            chunk_commands.append(command)
+
+        if chunk and not self._inject(bytes(chunk) + b'\x00'):
+            dropped.extend(chunk_commands)
+        return dropped
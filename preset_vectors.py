@@ -0,0 +1,107 @@
+from constants import MEMORY_MAP
+from weather_presets import ENVIRONMENT_PRESETS
+
+
+def _property_layout():
+    ## [(property, first column, width)] in MEMORY_MAP order, colors take three columns
+    layout = []
+    first = 0
+    for info in MEMORY_MAP["dvars"].values():
+        width = 3 if info["type"] == "color" else 1
+        for prop in info["properties"]:
+            layout.append((prop, first, width))
+            first += width
+    return layout
+
+
+def _dvar_entries(layout):
+    ## column -> the layout entries of every property feeding the same dvar
+    entries = {}
+    index = 0
+    for info in MEMORY_MAP["dvars"].values():
+        group = layout[index:index + len(info["properties"])]
+        index += len(group)
+        for _, first, width in group:
+            for column in range(first, first + width):
+                entries[column] = group
+    return entries
+
+
+PRESET_LAYOUT = _property_layout()
+PRESET_WIDTH = sum(width for _, _, width in PRESET_LAYOUT)
+DVAR_ENTRIES = _dvar_entries(PRESET_LAYOUT)
+## columns closer than this count as equal, a transition leaves them alone
+TRANSITION_EPSILON = 1e-6
+
+
+def normalise_preset(preset):
+    ## preset as flat property values, the nested sun_direction {"x", "y"} becomes sun_direction_x / _y
+    values = {prop: preset[prop] for prop, _, _ in PRESET_LAYOUT if preset.get(prop) is not None}
+    direction = preset.get("sun_direction")
+    if isinstance(direction, dict):
+        for axis in ("x", "y"):
+            if direction.get(axis) is not None:
+                values[f"sun_direction_{axis}"] = direction[axis]
+    return values
+
+
+class CompiledPresets:
+    ## every preset as one flat float vector in PRESET_LAYOUT order, with the properties it sets
+    ## a transition is a lerp of two vectors over the columns the target preset sets
+
+    def __init__(self, presets):
+        self.names = list(presets)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.vectors = []
+        self.layouts = []  # per preset, the PRESET_LAYOUT entries it sets
+        for name in self.names:
+            vector, layout = self.vectorise(normalise_preset(presets[name]))
+            self.vectors.append(vector)
+            self.layouts.append(layout)
+
+    @staticmethod
+    def vectorise(values):
+        ## (vector, layout of the properties present), missing columns are 0
+        vector = [0.0] * PRESET_WIDTH
+        layout = []
+        for entry in PRESET_LAYOUT:
+            prop, first, width = entry
+            value = values.get(prop)
+            if value is None:
+                continue
+            if width == 1:
+                vector[first] = float(value)
+            elif isinstance(value, (list, tuple)) and len(value) >= width:
+                vector[first:first + width] = [float(v) for v in value[:width]]
+            else:
+                continue
+            layout.append(entry)
+        return vector, layout
+
+    @staticmethod
+    def unpack(vector, layout):
+        return {prop: vector[first] if width == 1 else vector[first:first + width] for prop, first, width in layout}
+
+    @staticmethod
+    def entries(columns):
+        ## PRESET_LAYOUT entries of every dvar with one of the columns, a dvar is written with all its
+        ## arguments at once, so a partner property that doesn't move goes out with its current value
+        wanted = set()
+        for column in columns:
+            wanted.update(DVAR_ENTRIES[column])
+        return [entry for entry in PRESET_LAYOUT if entry in wanted]
+
+    @staticmethod
+    def columns(layout):
+        return [column for _, first, width in layout for column in range(first, first + width)]
+
+    def get(self, name):
+        ## preset id or None
+        return self.index.get(name)
+
+    def values(self, preset_id):
+        ## flat property values for update_all_properties, fresh lists every call
+        return self.unpack(self.vectors[preset_id], self.layouts[preset_id])
+
+
+ENVIRONMENT_VECTORS = CompiledPresets(ENVIRONMENT_PRESETS)
@@ -0,0 +1,58 @@
+import threading
+
+
+class ProcessWatcher:
+    ## keeps MemoryManager attached to the game in the background:
+    ## while connected it only checks the cached process handle, while disconnected it retries with backoff
+
+    def __init__(self, memory_manager, poll_interval=1.0, max_backoff=10.0):
+        self.memory_manager = memory_manager
+        self.poll_interval = poll_interval
+        self.max_backoff = max_backoff
+        self.watch_thread = None
+        self.stop_event = threading.Event()
+
+    def start(self):
+        if self.watch_thread and self.watch_thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.watch_thread = threading.Thread(target=self._watch_worker)
+        self.watch_thread.daemon = True
+        self.watch_thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.watch_thread and self.watch_thread.is_alive():
+            self.watch_thread.join(timeout=1.0)
+
+    def _watch_worker(self):
+        backend = self.memory_manager.backend
+        backoff = self.poll_interval
+
+        while not self.stop_event.is_set():
+            try:
+                if backend.is_connected():
+                    if not backend.is_alive():
+                        self.memory_manager._debug("Game process exited, waiting for it to come back.", is_error=True)
+                        backend.disconnect(process_exited=True)
+                        self.memory_manager.publish_status()
+                        backoff = self.poll_interval
+                    self.stop_event.wait(self.poll_interval)
+                    continue
+
+                if self.memory_manager.auto_connect():
+                    backoff = self.poll_interval
+                    self.memory_manager.publish_status()
+                    continue
+            except Exception as e:
+                ## a half-finished attach (ring/arena setup, reading the game) must not end the watcher
+                self.memory_manager._debug(f"Process watcher: {e}", is_error=True)
+                backend.disconnect()
+                backend.status_message = "Lost the game connection, retrying."
+                try:
+                    self.memory_manager.publish_status()
+                except Exception:
+                    pass
+
+            self.stop_event.wait(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
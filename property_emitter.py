@@ -0,0 +1,79 @@
+from constants import MEMORY_MAP
+
+## decimals sent for float arguments unless the dvar entry sets "precision"
+DEFAULT_PRECISION = 2
+COLOR_COMPONENTS = 3
+
+
+class DvarEmitter:
+    ## one dvar: the properties feeding its arguments and a format template built once
+
+    __slots__ = ("dvar", "properties", "primary", "kind", "template", "min_step", "last_sent")
+
+    def __init__(self, dvar, info):
+        self.dvar = dvar
+        self.properties = tuple(info["properties"])
+        self.primary = self.properties[0]  # the property a frame has to contain for the dvar to be written
+        self.kind = info["type"]
+
+        if self.kind == "int":
+            arg = "{:d}"
+            resolution = 1
+        else:
+            precision = info.get('precision', DEFAULT_PRECISION)
+            arg = f"{{:.{precision}f}}"
+            resolution = 10 ** -precision
+        ## a step below the printed resolution would not change the command anyway
+        self.min_step = max(info.get("min_step", resolution), resolution)
+        self.last_sent = None  # arguments of the last write, what the change budget is measured against
+        arity = COLOR_COMPONENTS if self.kind == "color" else len(self.properties)
+        self.template = " ".join([arg] * arity)
+
+    def write(self, values, budgeted=False, exact=()):
+        ## (dvar, arguments, argument text) for set_dvars, None if the frame doesn't set this dvar
+        ## budgeted writes are held back until they moved min_step away from the last write, unless exact
+        value = values.get(self.primary)
+        if value is None:
+            return None
+        if self.kind == "color":
+            if not isinstance(value, (list, tuple)) or len(value) < COLOR_COMPONENTS:
+                return None
+            args = (value[0], value[1], value[2])
+        elif self.kind == "int":
+            args = (int(value),)
+        elif len(self.properties) == 1:
+            args = (value,)
+        else:
+            ## properties missing from the frame are sent as 0, properties set to None skip the dvar
+            args = (value,) + tuple(values.get(prop, 0.0) for prop in self.properties[1:])
+            if None in args:
+                return None
+
+        if budgeted and self.last_sent is not None and not any(prop in exact for prop in self.properties):
+            min_step = self.min_step
+            if all(abs(a - b) < min_step for a, b in zip(args, self.last_sent)):
+                return None
+        self.last_sent = args
+        return self.dvar, args, self.template.format(*args)
+
+
+class PropertyEmitter:
+    ## compiled from MEMORY_MAP["dvars"], adding a property there is all it takes to animate it
+
+    def __init__(self, dvars=None):
+        dvars = MEMORY_MAP["dvars"] if dvars is None else dvars
+        self.emitters = [DvarEmitter(dvar, info) for dvar, info in dvars.items()]
+        self.primary = {e.dvar: e.primary for e in self.emitters}  # dvar -> property naming its source
+
+    def emit(self, values, budgeted=False, exact=()):
+        writes = []
+        for emitter in self.emitters:
+            write = emitter.write(values, budgeted, exact)
+            if write is not None:
+                writes.append(write)
+        return writes
+
+    def reset_budget(self):
+        ## forget what was sent, the next write of every dvar goes out
+        for emitter in self.emitters:
+            emitter.last_sent = None
@@ -0,0 +1,125 @@
+import ctypes
+import threading
+import time
+
+## one allocation granule in the game process: cached call stubs up front, command string slots after it
+ARENA_SIZE = 0x10000
+ARENA_CODE_SIZE = 0x400
+ARENA_SLOT_SIZE = 0x1000
+ARENA_SLOT_COUNT = (ARENA_SIZE - ARENA_CODE_SIZE) // ARENA_SLOT_SIZE
+
+
+class RemoteArena:
+    ## reusable remote memory for the remote-thread injection path, so a command only writes its text
+
+    def __init__(self, pm, cbuf_addtext, debug_callback, stats=None):
+        self.pm = pm
+        self.cbuf_addtext = cbuf_addtext
+        self._debug = debug_callback
+        self.stats = stats  # InjectionStats or None
+        self.base = None
+        self.code_used = 0
+        self.stubs = {}  # ecx value -> stub address
+        self.free_slots = []
+        self.slot_available = threading.Condition()
+
+    def create(self):
+        try:
+            self.base = self.pm.allocate(ARENA_SIZE)
+        except Exception as e:
+            self._debug(f"Remote arena: allocation failed: {e}", is_error=True)
+            self.base = None
+        if not self.base:
+            return False
+
+        self.code_used = 0
+        self.stubs = {}
+        self.free_slots = [self.base + ARENA_CODE_SIZE + i * ARENA_SLOT_SIZE for i in range(ARENA_SLOT_COUNT)]
+        try:
+            self.get_stub(0)
+        except Exception as e:
+            self._debug(f"Remote arena: could not write shellcode: {e}", is_error=True)
+            self.release()
+            return False
+        self._debug(f"Remote arena created at {hex(self.base)} ({ARENA_SLOT_COUNT} slots).")
+        return True
+
+    def is_ready(self):
+        return self.base is not None
+
+    def get_stub(self, value):
+        ## the thread parameter carries the command address, so one stub per ecx value is enough
+        stub_addr = self.stubs.get(value)
+        if stub_addr is not None:
+            return stub_addr
+
+        shellcode = (
+                b"\x8B\x44\x24\x04" +  # mov eax, [esp+4]
+                b"\xB9" + value.to_bytes(4, 'little') +
+                b"\xBA" + self.cbuf_addtext.to_bytes(4, 'little') +
+                b"\xFF\xD2" +
+                b"\xC2\x04\x00"
+        )
+        if self.code_used + len(shellcode) > ARENA_CODE_SIZE:
+            return None
+
+        stub_addr = self.base + self.code_used
+        self.pm.write_bytes(stub_addr, shellcode, len(shellcode))
+        self.code_used += len(shellcode)
+        self.stubs[value] = stub_addr
+        return stub_addr
+
+    def acquire_slot(self):
+        with self.slot_available:
+            while not self.free_slots:
+                self.slot_available.wait()
+            return self.free_slots.pop()
+
+    def release_slot(self, slot_addr):
+        with self.slot_available:
+            self.free_slots.append(slot_addr)
+            self.slot_available.notify()
+
+    def run(self, command_bytes, value=0):
+        ## returns False when the arena can't take this command and the caller has to allocate
+        if self.base is None or len(command_bytes) > ARENA_SLOT_SIZE:
+            return False
+        stub_addr = self.get_stub(value)
+        if stub_addr is None:
+            return False
+
+        kernel32 = ctypes.windll.kernel32
+        slot_addr = self.acquire_slot()
+        try:
+            started = time.perf_counter()
+            self.pm.write_bytes(slot_addr, command_bytes, len(command_bytes))
+            written = time.perf_counter()
+            thread_handle = kernel32.CreateRemoteThread(
+                self.pm.process_handle, None, 0, stub_addr, slot_addr, 0, None
+            )
+            created = time.perf_counter()
+            if not thread_handle:
+                self._debug("Failed to create remote thread.", is_error=True)
+                return True
+            try:
+                kernel32.WaitForSingleObject(thread_handle, 0xFFFFFFFF)
+                if self.stats:
+                    self.stats.record("write", written - started)
+                    self.stats.record("remote_thread", created - written)
+                    self.stats.record("wait", time.perf_counter() - created)
+            finally:
+                kernel32.CloseHandle(thread_handle)
+        finally:
+            self.release_slot(slot_addr)
+        return True
+
+    def release(self):
+        if self.base is None:
+            return
+        try:
+            self.pm.free(self.base)
+        except Exception as e:
+            self._debug(f"Remote arena: free failed: {e}", is_error=True)
+        self.base = None
+        self.stubs = {}
+        self.free_slots = []
@@ -1,20 +1,30 @@
-import threading
 import time
-import random
 import math
+from property_emitter import PropertyEmitter
+from keyframe_tracks import CompiledKeyframes
+from keyframe_bake import bake_keyframes, BAKE_RATE
+from flicker_waveforms import FlickerWaveform
+from engine import ScriptEffect, FRAME, ENGINE_RATE, MULTIPLY, OVERRIDE
 
 
 class SunAnimationSystem:
-    def __init__(self, memory_manager, ui_callback):
+    def __init__(self, memory_manager, ui_callback, engine):
         self.memory_manager = memory_manager
         self.ui_callback = ui_callback
-        self.animation_thread = None
-        self.stop_animation = False
-        self.is_animating = False
+        self.engine = engine
         self._debug = memory_manager._debug
         self.current_interpolated_values = {}  # store currently values
+        self.compiled_keyframes = None
+        self._compiled_from = (None, None)  # (keyframes, easing_functions) the compiled tracks were built from
+        self.baked_keyframes = None
+        self._baked_from = (None, None, None)  # (compiled keyframes, duration, rate)
+        self.emitter = PropertyEmitter()
         self._debug = memory_manager._debug if hasattr(memory_manager, '_debug') else print
 
+    @property
+    def is_animating(self):
+        return self.engine.is_running("animation")
+
     @staticmethod
     def lerp(start, end, t):
         return start + (end - start) * t
@@ -31,33 +41,75 @@ class SunAnimationSystem:
     def ease_out_quad(t):
         return 1 - (1 - t) * (1 - t)
 
-    def _start_thread(self, worker_func, on_complete, *args):
-        if self.is_animating:
-            self.stop()
-            time.sleep(0.2)
-        self.stop_animation = False
-        self.is_animating = True
-        self.animation_thread = threading.Thread(target=worker_func, args=(on_complete, *args))
-        self.animation_thread.daemon = True
-        self.animation_thread.start()
+    def _start_effect(self, name, script, on_complete, slot="animation"):
+        ## replaces the running animation right away, the old one completes on the next engine tick
+        ## returns the effect as the animation's completion handle
+        self.emitter.reset_budget()
+        return self.engine.run(slot, ScriptEffect(name, "animator", script, on_complete))
 
     def animate_sun_direction(self, start_x, end_x, start_y, end_y, duration, fps, easing, reset_on_finish,
                               on_complete=None):
-        self._start_thread(self._linear_worker, on_complete, start_x, end_x, start_y, end_y, duration, fps, easing,
-                           reset_on_finish)
+        ## a sweep only moves the sun like an orbit does, so it takes over from one
+        self.engine.stop("orbit")
+        return self._start_effect("Sun animation", lambda effect: self._linear_script(
+            effect, start_x, end_x, start_y, end_y, duration, fps, easing, reset_on_finish), on_complete)
 
     def animate_sun_orbital(self, center_x, center_y, radius_x, radius_y, rev_duration, direction, on_complete=None):
-        self._start_thread(self._orbital_worker, on_complete, center_x, center_y, radius_x, radius_y, rev_duration,
-                           direction)
+        ## the orbit has its own slot and overrides sun_direction, keyframes keep animating everything else
+        return self._start_effect("Orbital animation", lambda effect: self._orbital_script(
+            effect, center_x, center_y, radius_x, radius_y, rev_duration, direction), on_complete, slot="orbit")
 
-    def animate_from_keyframes(self, keyframes, total_duration, easing_functions, on_complete=None):
+    def animate_from_keyframes(self, keyframes, total_duration, easing_functions, on_complete=None, baked=False):
         ## valdiate before starting
         if not self._validate_keyframes_for_animation(keyframes):
             if on_complete:
                 on_complete()
             return
 
-        self._start_thread(self._keyframe_worker, on_complete, keyframes, total_duration, easing_functions)
+        ## baked: everything is sampled into a table up front, playback only looks up rows
+        if baked:
+            table = self.bake_keyframes(keyframes, total_duration, easing_functions)
+            if table is not None:
+                return self._start_effect("Baked animation", lambda effect: self._baked_script(
+                    effect, table, total_duration), on_complete)
+            self._debug("Keyframes can't be baked (mismatched values), playing them live.", is_error=True)
+
+        compiled = self.compile_keyframes(keyframes, easing_functions)
+        return self._start_effect("Keyframe animation", lambda effect: self._keyframe_script(
+            effect, compiled, total_duration), on_complete)
+
+    def bake_keyframes(self, keyframes, total_duration, easing_functions, rate=BAKE_RATE):
+        ## reused for scrubbing and export until the keyframes, duration or rate change
+        compiled = self.compile_keyframes(keyframes, easing_functions)
+        if self._baked_from != (compiled, total_duration, rate) or self.baked_keyframes is None:
+            start = time.perf_counter()
+            self.baked_keyframes = bake_keyframes(compiled, total_duration, rate)
+            self._baked_from = (compiled, total_duration, rate)
+            if self.baked_keyframes is not None:
+                self._debug(f"Baked {self.baked_keyframes.row_count} frames in "
+                            f"{(time.perf_counter() - start) * 1000:.1f}ms.")
+        return self.baked_keyframes
+
+    @staticmethod
+    def _pass_keys(key_times, next_key, elapsed):
+        ## index of the first keyframe still ahead of elapsed
+        while next_key < len(key_times) and key_times[next_key] <= elapsed:
+            next_key += 1
+        return next_key
+
+    def _baked_script(self, effect, table, total_duration):
+        next_key = 0
+        while True:
+            elapsed = effect.elapsed()
+            values = table.values_at(min(elapsed, total_duration))
+            self.current_interpolated_values = values
+            if elapsed >= total_duration:
+                effect.set_values(values, exact=True)
+                return
+            passed_key = self._pass_keys(table.key_times, next_key, elapsed)
+            effect.set_values(values, exact=passed_key != next_key)
+            next_key = passed_key
+            yield FRAME
 
     def _validate_keyframes_for_animation(self, keyframes):
         if len(keyframes) < 2:
@@ -80,108 +132,50 @@ class SunAnimationSystem:
 
         return True
 
-    def _keyframe_worker(self, on_complete, keyframes, total_duration, easing_functions):
-        start_time = time.time()
-        frame_delay = 1.0 / 60.0
-
-        while not self.stop_animation:
-            elapsed = time.time() - start_time
+    def _keyframe_script(self, effect, compiled, total_duration):
+        next_key = 0
+        while True:
+            elapsed = effect.elapsed()
 
             if elapsed >= total_duration:
                 # set final values from last keyframe
-                final_values = self.interpolate_values_at_time(total_duration, keyframes, easing_functions)
-                if final_values:
-                    self.update_all_properties(final_values)
-                break
-
-            interpolated_values = self.interpolate_values_at_time(elapsed, keyframes, easing_functions)
-            if interpolated_values:
-                self.update_all_properties(interpolated_values)
-
-            time.sleep(frame_delay)
-
-        self.is_animating = False
-        if on_complete:
-            on_complete()
+                effect.set_values(compiled.evaluate(total_duration), exact=True)
+                return
+
+            ## the first frame past a keyframe bypasses the change budget, so turning points aren't flattened
+            passed_key = self._pass_keys(compiled.key_times, next_key, elapsed)
+            interpolated_values = compiled.evaluate(elapsed)
+            self.current_interpolated_values = interpolated_values
+            effect.set_values(interpolated_values, exact=passed_key != next_key)
+            next_key = passed_key
+            yield FRAME
+
+    def compile_keyframes(self, keyframes, easing_functions):
+        ## keyframe edits always replace the list, so identity tells whether the tracks are still valid
+        source_keyframes, source_easings = self._compiled_from
+        if self.compiled_keyframes is None or source_keyframes is not keyframes or source_easings is not easing_functions:
+            self.compiled_keyframes = CompiledKeyframes(keyframes, easing_functions)
+            self._compiled_from = (keyframes, easing_functions)
+        return self.compiled_keyframes
 
     def interpolate_values_at_time(self, elapsed_time, keyframes, easing_functions):
         if not keyframes:
             return {}
 
-        # if before first keyframes, return fisrt keyframe values
-        if elapsed_time <= keyframes[0]['time']:
-            return keyframes[0]['values'].copy()
-
-        # if after last keyframe, return last keyframe values
-        if elapsed_time >= keyframes[-1]['time']:
-            return keyframes[-1]['values'].copy()
-
-        ## find surrounding keyframes
-        prev_kf = keyframes[0]
-        next_kf = keyframes[-1]
-
-        for i in range(len(keyframes) - 1):
-            if keyframes[i]['time'] <= elapsed_time < keyframes[i + 1]['time']:
-                prev_kf = keyframes[i]
-                next_kf = keyframes[i + 1]
-                break
-
-        ## calc interp factors
-        segment_duration = next_kf['time'] - prev_kf['time']
-        if segment_duration <= 0:
-            return prev_kf['values'].copy()
-
-        t = (elapsed_time - prev_kf['time']) / segment_duration
-        #apply easing
-        easing_func = easing_functions.get(prev_kf.get('easing', 'Linear'), lambda t: t)
-        eased_t = easing_func(t)
-
-        p_vals = prev_kf['values']
-        n_vals = next_kf['values']
-        interpolated = {}
-
-        all_properties = set(p_vals.keys()) | set(n_vals.keys())
-
-        for key in all_properties:
-
-            prev_val = p_vals.get(key)
-            next_val = n_vals.get(key)
-
-
-            if prev_val is None:
-                interpolated[key] = next_val
-            elif next_val is None:
-                interpolated[key] = prev_val
-            else:
-
-                if isinstance(prev_val, (int, float)):
-                    interpolated[key] = self.lerp(prev_val, next_val, eased_t)
-                elif isinstance(prev_val, list) and isinstance(next_val, list):
-
-                    if len(prev_val) == len(next_val):
-                        interpolated[key] = [self.lerp(prev_val[i], next_val[i], eased_t)
-                                             for i in range(len(prev_val))]
-                    else:
-
-                        interpolated[key] = next_val if eased_t > 0.5 else prev_val
-                else:
-
-                    interpolated[key] = next_val if eased_t > 0.5 else prev_val
-
-        self.current_interpolated_values = interpolated.copy()
-        return interpolated
+        interpolated = self.compile_keyframes(keyframes, easing_functions).evaluate(elapsed_time)
+        self.current_interpolated_values = interpolated
+        return interpolated.copy()
 
     def get_current_animation_values(self):
         return self.current_interpolated_values.copy()
 
-    def _linear_worker(self, on_complete, start_x, end_x, start_y, end_y, duration, fps, easing, reset_on_finish):
-        start_time = time.time()
-        frame_delay = 1.0 / fps
+    def _linear_script(self, effect, start_x, end_x, start_y, end_y, duration, fps, easing, reset_on_finish):
+        frame_delay = FRAME if fps >= ENGINE_RATE else 1.0 / fps
 
-        while not self.stop_animation:
-            elapsed = time.time() - start_time
+        while True:
+            elapsed = effect.elapsed()
             if elapsed >= duration:
-                self.update_all_properties({"sun_direction_x": end_x, "sun_direction_y": end_y})
+                effect.set_values({"sun_direction_x": end_x, "sun_direction_y": end_y}, exact=True)
                 break
 
             progress = elapsed / duration
@@ -197,205 +191,111 @@ class SunAnimationSystem:
 
             values = {"sun_direction_x": current_x, "sun_direction_y": current_y}
             self.current_interpolated_values = values.copy()
-            self.update_all_properties(values)
+            effect.set_values(values)
 
-            time.sleep(frame_delay)
+            yield frame_delay
 
-        if not self.stop_animation and reset_on_finish:
-            time.sleep(0.1)
+        if reset_on_finish:
+            yield 0.1
             reset_values = {"sun_direction_x": 0, "sun_direction_y": 0}
             self.current_interpolated_values = reset_values.copy()
-            self.update_all_properties(reset_values)
+            effect.set_values(reset_values, exact=True)
 
-        self.is_animating = False
-        if on_complete:
-            on_complete()
-
-    def _orbital_worker(self, on_complete, center_x, center_y, radius_x, radius_y, rev_duration, direction):
-        start_time = time.time()
+    def _orbital_script(self, effect, center_x, center_y, radius_x, radius_y, rev_duration, direction):
         dir_multiplier = -1 if direction == "Clockwise" else 1
 
-        while not self.stop_animation:
-            elapsed = time.time() - start_time
+        while True:
+            elapsed = effect.elapsed()
             angle = (elapsed / rev_duration) * 2 * math.pi * dir_multiplier
             current_x = center_x + radius_x * math.cos(angle)
             current_y = center_y + radius_y * math.sin(angle)
 
             values = {"sun_direction_x": current_x, "sun_direction_y": current_y}
             self.current_interpolated_values = values.copy()
-            self.update_all_properties(values)
-
-            time.sleep(1 / 60)
+            effect.set_values(values, layer=OVERRIDE)
 
-        self.is_animating = False
-        if on_complete:
-            on_complete()
+            yield FRAME
 
-    def update_all_properties(self, values):
+    def update_all_properties(self, values, source="animator", budgeted=False, exact=(), ui_values=None):
+        ## the emitter turns the frame into (dvar, args) writes, set_dvars batches them
+        ## budgeted: playback frames, small changes are held back per dvar until they add up to its min_step
         try:
-            if 'sun_strength' in values and values['sun_strength'] is not None:
-                self.memory_manager.execute_command(f"r_lighttweaksunlight {values['sun_strength']:.2f}")
-
-            if 'sun_direction_x' in values and 'sun_direction_y' in values:
-                if values['sun_direction_x'] is not None and values['sun_direction_y'] is not None:
-                    self.memory_manager.execute_command(
-                        f"r_lighttweaksundirection {values['sun_direction_x']:.2f} {values['sun_direction_y']:.2f}")
-            elif 'sun_direction_x' in values and values['sun_direction_x'] is not None:
-                ## if only x is selected get the current y value
-                current_y = values.get('sun_direction_y', 0.0)
-                self.memory_manager.execute_command(
-                    f"r_lighttweaksundirection {values['sun_direction_x']:.2f} {current_y:.2f}")
-
-            if 'sun_color' in values and values['sun_color'] is not None:
-                c = values['sun_color']
-                if isinstance(c, list) and len(c) >= 3:
-                    self.memory_manager.execute_command(f"r_lighttweaksuncolor {c[0]:.2f} {c[1]:.2f} {c[2]:.2f}")
-
-            if 'brightness' in values and values['brightness'] is not None:
-                self.memory_manager.execute_command(f"r_filmtweakbrightness {values['brightness']:.2f}")
-
-            if 'contrast' in values and values['contrast'] is not None:
-                self.memory_manager.execute_command(f"r_filmtweakcontrast {values['contrast']:.2f}")
-
-            if 'desaturation' in values and values['desaturation'] is not None:
-                self.memory_manager.execute_command(f"r_filmtweakdesaturation {values['desaturation']:.2f}")
-
-            if 'light_color' in values and values['light_color'] is not None:
-                c = values['light_color']
-                if isinstance(c, list) and len(c) >= 3:
-                    self.memory_manager.execute_command(f"r_filmtweaklighttint {c[0]:.2f} {c[1]:.2f} {c[2]:.2f}")
-
-            if 'dark_color' in values and values['dark_color'] is not None:
-                c = values['dark_color']
-                if isinstance(c, list) and len(c) >= 3:
-                    self.memory_manager.execute_command(f"r_filmtweakdarktint {c[0]:.2f} {c[1]:.2f} {c[2]:.2f}")
-
-            if 'fog_start' in values and values['fog_start'] is not None:
-                self.memory_manager.execute_command(f"mvm_fog_start {values['fog_start']:.2f}")
-
-            if 'fog_color' in values and values['fog_color'] is not None:
-                c = values['fog_color']
-                if isinstance(c, list) and len(c) >= 3:
-                    self.memory_manager.execute_command(f"mvm_fog_color {c[0]:.2f} {c[1]:.2f} {c[2]:.2f}")
-                    if hasattr(self, '_debug'):
-                        self._debug(f"Setting fog color: {c[0]:.2f} {c[1]:.2f} {c[2]:.2f}")
-
-            ## fov is handled different because of glichting
-            if 'fov' in values and values['fov'] is not None:
-                self.memory_manager.execute_command(f"cg_fov {int(values['fov'])}")
+            writes = self.emitter.emit(values, budgeted, exact)
+            if isinstance(source, dict):
+                ## engine frames name the effect behind each property, so the stats stay per effect
+                by_source = {}
+                for write in writes:
+                    write_source = source.get(self.emitter.primary[write[0]], "engine")
+                    by_source.setdefault(write_source, []).append(write)
+                for write_source, source_writes in by_source.items():
+                    self.memory_manager.set_dvars(source_writes, write_source)
+            else:
+                self.memory_manager.set_dvars(writes, source)
 
             ## update ui callback
             if self.ui_callback:
+                if ui_values is not None:
+                    values = ui_values
                 ## filter "none" values before starting
-                filtered_values = {k: v for k, v in values.items() if v is not None}
-                if filtered_values:
-                    self.ui_callback(filtered_values)
+                if None in values.values():
+                    values = {k: v for k, v in values.items() if v is not None}
+                if values:
+                    self.ui_callback(values)
 
         except Exception as e:
             print(f"Error updating properties: {e}")
 
+    def emit_frame(self, frame):
+        ## engine output: everything the active effects set this tick goes out as one batch, one value per dvar
+        ## the ui follows the base layers only, modifiers like flicker don't move the sliders
+        self.update_all_properties(frame.resolve(), source=frame.sources, budgeted=True, exact=frame.exact,
+                                   ui_values=frame.values)
+
     def stop(self):
-        self.stop_animation = True
+        self.engine.stop("animation")
+        self.engine.stop("orbit")
         self.current_interpolated_values = {}
 
 
 class SunFlickerSystem:
-    def __init__(self, memory_manager):
+    ## flicker scales sun_strength, so it rides on top of whatever animation sets the strength
+    ## and falls back to the strength it was started with when nothing else does
+
+    def __init__(self, memory_manager, engine):
         self.memory_manager = memory_manager
-        self.flicker_thread = None
-        self.stop_flicker = False
-        self.is_flickering = False
-        self.original_strength = 1.0
-
-    def _fade_strength(self, start, end, duration):
-        steps = 20
-        step_delay = duration / steps if steps > 0 else 0
-        for i in range(steps + 1):
-            if self.stop_flicker:
-                break
-            progress = i / steps
-            current_strength = SunAnimationSystem.lerp(start, end, progress)
-            self.memory_manager.execute_command(f"r_lighttweaksunlight {current_strength:.2f}")
-            if step_delay > 0:
-                time.sleep(step_delay)
-
-    def start(self, strength, speed_ms, preset="Pulse", use_easing=False):
-        if self.is_flickering:
-            self.stop()
-            time.sleep(0.2)
-        self.stop_flicker = False
-        self.is_flickering = True
-        self.original_strength = strength if strength > 0 else 1.0
-        delay = max(0.01, speed_ms / 1000.0)
-
-        def flicker_worker():
-            initial_strength = self.original_strength
-            while not self.stop_flicker:
-                on_action = lambda: self._fade_strength(0, self.original_strength,
-                                                        delay) if use_easing else self.memory_manager.execute_command(
-                    f"r_lighttweaksunlight {self.original_strength:.2f}")
-                off_action = lambda: self._fade_strength(self.original_strength, 0,
-                                                         delay) if use_easing else self.memory_manager.execute_command(
-                    f"r_lighttweaksunlight 0")
-
-                if preset == "Pulse":
-                    off_action()
-                    time.sleep(delay if not use_easing else 0)
-                    if self.stop_flicker:
-                        break
-                    on_action()
-                    time.sleep(delay if not use_easing else 0)
-                elif preset == "Faulty":
-                    on_action()
-                    time.sleep(random.uniform(0.02, 0.2))
-                    if self.stop_flicker:
-                        break
-                    off_action()
-                    time.sleep(random.uniform(delay * 0.5, delay * 1.5))
-                elif preset == "Strobe":
-                    on_action()
-                    time.sleep(0.02 if not use_easing else 0)
-                    if self.stop_flicker:
-                        break
-                    off_action()
-                    time.sleep(delay)
-                elif preset == "Storm":
-                    for _ in range(random.randint(2, 4)):
-                        if self.stop_flicker:
-                            break
-                        on_action()
-                        time.sleep(random.uniform(0.02, 0.05))
-                        off_action()
-                        time.sleep(random.uniform(0.02, 0.08))
-                    if self.stop_flicker:
-                        break
-                    time.sleep(random.uniform(3.0, 8.0))
-                elif preset == "Heartbeat":
-                    on_action()
-                    time.sleep(0.1 if not use_easing else 0)
-                    off_action()
-                    time.sleep(0.1 if not use_easing else 0)
-                    if self.stop_flicker:
-                        break
-                    on_action()
-                    time.sleep(0.1 if not use_easing else 0)
-                    off_action()
-                    time.sleep(delay)
-                elif preset == "Candle":
-                    current_strength = self.original_strength * random.uniform(0.7, 0.95)
-                    fade_duration = random.uniform(delay * 0.8, delay * 1.2)
-                    self._fade_strength(self.original_strength, current_strength, fade_duration)
-                    if self.stop_flicker:
-                        break
-                    self.original_strength = current_strength
-
-            ## restore original strength
-            self.memory_manager.execute_command(f"r_lighttweaksunlight {initial_strength}")
-            self.is_flickering = False
-
-        self.flicker_thread = threading.Thread(target=flicker_worker)
-        self.flicker_thread.daemon = True
-        self.flicker_thread.start()
+        self.engine = engine
+        self.base_strength = 1.0
+        self.last_seed = None  # seed of the last run, to repeat a take
+
+    @property
+    def is_flickering(self):
+        return self.engine.is_running("flicker")
+
+    def _set_factor(self, effect, factor, exact=False):
+        effect.modify("sun_strength", factor, MULTIPLY, rest=self.base_strength, exact=exact)
+
+    @staticmethod
+    def create_waveform(speed_ms, preset="Pulse", use_easing=False, seed=None):
+        return FlickerWaveform(preset, max(0.01, speed_ms / 1000.0), use_easing, seed)
+
+    def start(self, strength, speed_ms, preset="Pulse", use_easing=False, seed=None):
+        ## replaces a running flicker right away, returns the effect, last_seed repeats the take
+        self.base_strength = strength if strength > 0 else 1.0
+        waveform = self.create_waveform(speed_ms, preset, use_easing, seed)
+        self.last_seed = waveform.seed
+        return self.engine.run("flicker", ScriptEffect(
+            f"{preset} flicker", "flicker", lambda effect: self._flicker_script(effect, waveform)))
+
+    def _flicker_script(self, effect, waveform):
+        ## fades are sampled on engine ticks, flat stretches sleep until the next breakpoint
+        try:
+            while True:
+                factor, flat_for, passed = waveform.sample(effect.elapsed())
+                self._set_factor(effect, factor, exact=passed)
+                yield flat_for if flat_for > 0 else FRAME
+        finally:
+            ## back to the unscaled strength
+            self._set_factor(effect, 1.0, exact=True)
 
     def stop(self):
-        self.stop_flicker = True
\ No newline at end of file
+        self.engine.stop("flicker")
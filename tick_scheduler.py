@@ -0,0 +1,71 @@
+import time
+
+## sleep() is only trusted up to this close to a deadline, the rest is spun on perf_counter
+SPIN_THRESHOLD = 0.002
+## longest single sleep, so a stop request is noticed quickly even during long waits
+MAX_SLEEP_CHUNK = 0.05
+
+
+def sleep_until(deadline, should_stop=None):
+    ## returns False if should_stop() became true before the deadline
+    while True:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return True
+        if should_stop and should_stop():
+            return False
+        if remaining > SPIN_THRESHOLD:
+            time.sleep(min(remaining - SPIN_THRESHOLD, MAX_SLEEP_CHUNK))
+        else:
+            time.sleep(0)
+
+
+class TickScheduler:
+    ## absolute deadlines on perf_counter: frame n is due at start + n * period no matter how long the work took
+    ## a frame that is already late is counted as missed and skipped instead of being caught up in a burst
+
+    def __init__(self, should_stop=None):
+        self.should_stop = should_stop
+        self.start_time = time.perf_counter()
+        self.deadline = self.start_time
+        self.tick_count = 0
+        self.missed_count = 0
+        self.worst_lateness = 0.0
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        self.deadline = self.start_time
+        self.tick_count = 0
+        self.missed_count = 0
+        self.worst_lateness = 0.0
+
+    def elapsed(self):
+        return time.perf_counter() - self.start_time
+
+    def wait_frame(self, frame_delay):
+        ## waits for the next frame deadline, returns False if stopped
+        self.tick_count += 1
+        self.deadline += frame_delay
+        now = time.perf_counter()
+        if now > self.deadline:
+            lateness = now - self.deadline
+            self.worst_lateness = max(self.worst_lateness, lateness)
+            if frame_delay > 0 and lateness >= frame_delay:
+                skipped = int(lateness // frame_delay)
+                self.missed_count += skipped
+                self.deadline += skipped * frame_delay
+        return sleep_until(self.deadline, self.should_stop)
+
+    def wait(self, seconds):
+        ## one-off delay measured from the previous deadline, so chained waits don't drift
+        self.deadline += seconds
+        return sleep_until(self.deadline, self.should_stop)
+
+    def resync(self):
+        ## after waiting on something external, continue from now
+        self.deadline = time.perf_counter()
+
+    def report(self, debug_callback, name):
+        if self.missed_count:
+            debug_callback(f"{name}: missed {self.missed_count} of {self.tick_count} frame deadlines "
+                           f"(worst {self.worst_lateness * 1000:.1f}ms late).", is_error=True)
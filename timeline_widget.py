@@ -73,7 +73,8 @@ class TimelineWidget:
                 'Linear': (150, 150, 150),
                 'Smooth': (100, 200, 100),
                 'Ease-In': (200, 100, 100),
-                'Ease-Out': (100, 100, 200)
+                'Ease-Out': (100, 100, 200),
+                'Spline': (200, 170, 80)
             }
             color = color_map.get(easing, (150, 150, 150))
             fill_color = (*color, 80)